@@ -1,9 +1,32 @@
 #!/usr/bin/env python3
-"""Kvinde Klinikken AI Triage — Web UI entry point."""
+"""Kvinde Klinikken AI Triage — Web UI entry point.
+
+    python main.py                  # development: one process, auto-reload
+    python main.py --workers 4      # production: N worker processes, no reload
+
+WEB_CONCURRENCY sets the default worker count. Workers share the SQLite databases
+and conditions.yaml (edits reach every worker within CONFIG_CHECK_INTERVAL).
+"""
+
+import argparse
+import os
+import secrets
 
 import uvicorn
 
 from triage.api import app  # noqa: F401
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Run the triage web UI")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")),
+                        help="worker processes; 0 runs a single auto-reloading dev server")
+    args = parser.parse_args()
+
+    if args.workers > 0:
+        # Login cookies must verify on whichever worker serves the next request
+        os.environ.setdefault("COOKIE_SECRET", secrets.token_hex(32))
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
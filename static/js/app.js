@@ -17,6 +17,7 @@
     const startBtn = document.getElementById('startBtn');
     const sessionLabel = document.getElementById('sessionLabel');
     const typingIndicator = document.getElementById('typingIndicator');
+    const typingLabel = document.getElementById('typingLabel');
     const triageStatus = document.getElementById('triageStatus');
     const resultCard = document.getElementById('resultCard');
     const resultCardHeader = document.getElementById('resultCardHeader');
@@ -31,6 +32,7 @@
     let sessionId = null;
     let isConnected = false;
     let consentGiven = false;
+    let streamingBubble = null;
 
     // =========================================================================
     // GDPR Consent
@@ -105,6 +107,7 @@
 
         // Hide typing indicator
         typingIndicator.style.display = 'none';
+        streamingBubble = null;
 
         // Hide result card
         resultCard.style.display = 'none';
@@ -161,7 +164,21 @@
         switch (msg.type) {
             case 'chat':
                 hideTyping();
-                addMessage('agent', msg.data.message);
+                if (streamingBubble) {
+                    // Final text replaces whatever was streamed
+                    streamingBubble.textContent = msg.data.message;
+                    streamingBubble = null;
+                } else {
+                    addMessage('agent', msg.data.message);
+                }
+                break;
+
+            case 'chat_delta':
+                appendDelta(msg.data.delta);
+                break;
+
+            case 'tool_progress':
+                showTyping(msg.data.label);
                 break;
 
             case 'triage_update':
@@ -170,7 +187,17 @@
 
             case 'complete':
                 hideTyping();
+                discardStreaming();
                 handleCompletion(msg.data);
+                if (msg.data.confirmation_pending) {
+                    showTyping('Writing your confirmation');
+                }
+                break;
+
+            case 'confirmation':
+                // Arrives after 'complete'; the chat stays closed
+                typingIndicator.style.display = 'none';
+                addMessage('agent', msg.data.message);
                 break;
 
             case 'status':
@@ -203,9 +230,28 @@
         msgDiv.appendChild(bubble);
         chatMessages.appendChild(msgDiv);
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return bubble;
+    }
+
+    function appendDelta(delta) {
+        if (!streamingBubble) {
+            streamingBubble = addMessage('agent', '');
+            typingIndicator.style.display = 'none';
+        }
+        streamingBubble.textContent += delta;
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    function discardStreaming() {
+        // Completion turns end with their own message; drop any partial text
+        if (streamingBubble) {
+            streamingBubble.closest('.message').remove();
+            streamingBubble = null;
+        }
     }
 
-    function showTyping() {
+    function showTyping(label) {
+        typingLabel.textContent = label ? `${label}...` : 'Agent is thinking...';
         typingIndicator.style.display = 'flex';
         sendBtn.disabled = true;
         chatInput.disabled = true;
@@ -6,8 +6,12 @@
   const PROC = { new: 'New', in_progress: 'In progress', followup: 'Needs follow-up', done: 'Done' };
   const ACTIVE_COLS = ['new', 'in_progress', 'followup'];
   const ORDER = ['new', 'in_progress', 'followup', 'done'];
+  const ACTIVE_PAGE = 200;
+  const DONE_PAGE = 50;
 
   let rows = [];
+  let activeCursor = null;
+  let doneCursor = null;
   let tab = 'active';
   const filters = { type: 'all', urgentOnly: false, search: '' };
 
@@ -102,20 +106,26 @@
     const activeRows = visible.filter(r => !isClosed(r));
     const doneRows = visible.filter(r => isClosed(r));
 
-    document.getElementById('tabActiveCount').textContent = activeRows.length;
-    document.getElementById('tabDoneCount').textContent = doneRows.length;
+    document.getElementById('tabActiveCount').textContent = activeRows.length + (activeCursor ? '+' : '');
+    document.getElementById('tabDoneCount').textContent = doneRows.length + (doneCursor ? '+' : '');
 
     const board = document.getElementById('boardArea');
     if (tab === 'active') {
       board.innerHTML = '<div class="inbox-board">' +
         ACTIVE_COLS.map(s =>
           columnHtml(s, activeRows.filter(r => statusOf(r) === s).sort(sortCards))
-        ).join('') + '</div>';
+        ).join('') + '</div>' +
+        (activeCursor ? '<button class="btn load-more" id="loadMoreActive">Load more</button>' : '');
+      const more = document.getElementById('loadMoreActive');
+      if (more) more.onclick = () => loadMore(false);
     } else {
       const done = doneRows.slice().sort(sortCards);
       board.innerHTML = '<div class="done-list">' +
         (done.length ? done.map(cardHtml).join('') : '<div class="col-empty">No completed patients.</div>') +
+        (doneCursor ? '<button class="btn load-more" id="loadMoreDone">Load more</button>' : '') +
         '</div>';
+      const more = document.getElementById('loadMoreDone');
+      if (more) more.onclick = () => loadMore(true);
     }
     bindCards();
   }
@@ -207,17 +217,62 @@
     document.addEventListener('scroll', closeMenus, true);
   }
 
+  async function fetchPage(params) {
+    const resp = await fetch('/api/inbox?' + new URLSearchParams(params));
+    if (!resp.ok) throw new Error(resp.status);
+    return resp.json();
+  }
+
+  // The first page of active work and of Done (which includes cancellations);
+  // further pages of either are loaded on demand.
   async function load() {
     try {
-      const resp = await fetch('/api/inbox');
-      rows = await resp.json();
+      const [active, done] = await Promise.all([
+        fetchPage({ closed: 'false', limit: ACTIVE_PAGE }),
+        fetchPage({ closed: 'true', limit: DONE_PAGE }),
+      ]);
+      rows = active.items.concat(done.items);
+      activeCursor = active.next_cursor;
+      doneCursor = done.next_cursor;
     } catch (e) {
       showError('Failed to load the inbox.');
       rows = [];
+      activeCursor = doneCursor = null;
     }
     render();
   }
 
+  async function loadMore(closed) {
+    try {
+      const page = await fetchPage({
+        closed: String(closed),
+        limit: closed ? DONE_PAGE : ACTIVE_PAGE,
+        cursor: closed ? doneCursor : activeCursor,
+      });
+      // A live update may already have added some of these rows
+      const seen = new Set(rows.map(r => r.session_id));
+      rows = rows.concat(page.items.filter(r => !seen.has(r.session_id)));
+      if (closed) doneCursor = page.next_cursor; else activeCursor = page.next_cursor;
+    } catch (e) {
+      showError('Failed to load more.');
+    }
+    render();
+  }
+
+  // Live updates: the server pushes the full inbox row whenever a session
+  // completes or its processing/confirmation state changes.
+  function subscribe() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/inbox/stream');
+    source.addEventListener('row', (e) => {
+      const row = JSON.parse(e.data);
+      const i = rows.findIndex(x => x.session_id === row.session_id);
+      if (i >= 0) rows[i] = row; else rows.push(row);
+      render();
+    });
+    source.addEventListener('resync', load);
+  }
+
   // Called by session-detail.js after a status change inside the detail modal.
   window.InboxPage = {
     refreshRow(sessionId, proc, by) {
@@ -229,5 +284,5 @@
     }
   };
 
-  document.addEventListener('DOMContentLoaded', () => { bindControls(); load(); });
+  document.addEventListener('DOMContentLoaded', () => { bindControls(); load(); subscribe(); });
 })();
@@ -7,8 +7,11 @@
   const CATS = { A: 'A — Urgent', B: 'B — Semi-urgent', C: 'C — Standard' };
   const PROC = { new: 'New', in_progress: 'In progress', followup: 'Needs follow-up', done: 'Done' };
 
+  const TAIL_MS = 4000;
+
   let sessionId = null;
   let mode = 'history';
+  let tailTimer = null;
 
   function esc(s) {
     return String(s == null ? '' : s)
@@ -60,21 +63,54 @@
     return h;
   }
 
+  function convCount(n) {
+    return `Conversation (${n} message${n !== 1 ? 's' : ''})`;
+  }
+
+  function convMsg(m) {
+    const role = m.role === 'user' ? 'patient' : 'agent';
+    return `<div class="conv-msg conv-msg-${role}"><div class="conv-bubble conv-bubble-${role}">${esc(m.content)}</div></div>`;
+  }
+
   function renderConversation(d) {
-    if (!d.conversation || !d.conversation.length) return '';
+    const conv = d.conversation || [];
+    if (!conv.length && d.status !== 'active') return '';
     const openAttr = mode === 'history' ? ' open' : '';
-    const n = d.conversation.length;
     let h = `<details class="detail-result conv-details"${openAttr}>` +
-      `<summary class="conv-summary">Conversation (${n} message${n !== 1 ? 's' : ''})</summary>` +
+      `<summary class="conv-summary">${convCount(conv.length)}</summary>` +
       '<div class="conversation-display">';
-    for (const m of d.conversation) {
-      const role = m.role === 'user' ? 'patient' : 'agent';
-      h += `<div class="conv-msg conv-msg-${role}"><div class="conv-bubble conv-bubble-${role}">${esc(m.content)}</div></div>`;
-    }
+    for (const m of conv) h += convMsg(m);
     h += '</div></details>';
     return h;
   }
 
+  // While an active session is open, fetch only messages newer than the last one shown
+  function tailConversation(d) {
+    if (tailTimer) clearInterval(tailTimer);
+    tailTimer = null;
+    if (d.status !== 'active') return;
+    const id = sessionId;
+    const conv = d.conversation || [];
+    let lastId = conv.length ? conv[conv.length - 1].id : 0;
+    let n = conv.length;
+    tailTimer = setInterval(() => {
+      const modal = document.getElementById('detailModal');
+      if (sessionId !== id || !modal || modal.style.display === 'none') {
+        clearInterval(tailTimer); tailTimer = null; return;
+      }
+      fetch(`/api/sessions/${id}/conversation?after=${lastId}`).then(r => r.json()).then(res => {
+        const msgs = res.messages || [];
+        const box = document.querySelector('#modalBody .conversation-display');
+        if (sessionId !== id || !msgs.length || !box) return;
+        box.insertAdjacentHTML('beforeend', msgs.map(convMsg).join(''));
+        lastId = msgs[msgs.length - 1].id;
+        n += msgs.length;
+        const summary = document.querySelector('#modalBody .conv-summary');
+        if (summary) summary.textContent = convCount(n);
+      }).catch(() => {});
+    }, TAIL_MS);
+  }
+
   function renderResult(d) {
     if (!d.result) return '';
     const r = d.result, t = r.triage || {}, isHandoff = !!r.reason;
@@ -269,7 +305,7 @@
     body.innerHTML = '<div class="loading-spinner"></div>';
     fetch(`/api/sessions/${id}`).then(r => r.json()).then(d => {
       body.innerHTML = render(d);
-      bindExport(d); bindProcessing(); bindNoteForm(); loadNotes();
+      bindExport(d); bindProcessing(); bindNoteForm(); loadNotes(); tailConversation(d);
     }).catch(() => { body.innerHTML = '<p class="error-text">Failed to load session details.</p>'; });
   }
 
@@ -0,0 +1,256 @@
+"""Standalone verification for conditions config loading and cross-worker reloads.
+
+Run: python -m tests.test_config
+No LLM, no network — works on a temporary copy of conditions.yaml.
+"""
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import yaml
+
+_TESTS = []
+
+
+def test(fn):
+    _TESTS.append(fn)
+    return fn
+
+
+@contextmanager
+def _temp_config():
+    """Point triage.config at a scratch copy of conditions.yaml for the block."""
+    from triage import config
+    orig_path, orig_lock = config.CONFIG_PATH, config.CONFIG_LOCK_PATH
+    d = Path(tempfile.mkdtemp())
+    shutil.copy(orig_path, d / "conditions.yaml")
+    config.CONFIG_PATH, config.CONFIG_LOCK_PATH = d / "conditions.yaml", d / "conditions.lock"
+    try:
+        config.reload_conditions()
+        yield config
+    finally:
+        config.CONFIG_PATH, config.CONFIG_LOCK_PATH = orig_path, orig_lock
+        config.reload_conditions()
+
+
+def _other_worker_renames(path: Path, condition_id: int, name: str):
+    """Edit the file the way another process would: behind this module's back."""
+    data = yaml.safe_load(path.read_text())
+    for c in data["conditions"]:
+        if c["id"] == condition_id:
+            c["name"] = name
+    path.write_text(yaml.dump(data, allow_unicode=True, sort_keys=False))
+
+
+# ---------------------------------------------------------------------------
+# Cross-worker reload
+# ---------------------------------------------------------------------------
+
+@test
+def test_edit_by_other_worker_is_picked_up():
+    with _temp_config() as config:
+        version = config.config_version()
+        _other_worker_renames(config.CONFIG_PATH, 19, "Renamed elsewhere")
+        config._next_check = 0.0  # skip the throttle interval
+        assert config.get_conditions()[19]["name"] == "Renamed elsewhere"
+        assert "Renamed elsewhere" in config.get_condition_reference()
+        assert config.config_version() != version
+
+
+@test
+def test_local_edit_starts_from_latest_file():
+    with _temp_config() as config:
+        _other_worker_renames(config.CONFIG_PATH, 19, "Renamed elsewhere")
+        config.update_condition(21, {"duration": 99})  # within the throttle interval
+        saved = {c["id"]: c for c in yaml.safe_load(config.CONFIG_PATH.read_text())["conditions"]}
+        assert saved[19]["name"] == "Renamed elsewhere" and saved[21]["duration"] == 99
+
+
+# ---------------------------------------------------------------------------
+# Atomic, journaled saves
+# ---------------------------------------------------------------------------
+
+@test
+def test_failed_write_leaves_file_intact():
+    from unittest import mock
+    with _temp_config() as config:
+        before = config.CONFIG_PATH.read_bytes()
+
+        def dump_then_crash(data, f, **kw):
+            f.write("conditions:\n- id: 1\n")
+            raise OSError("disk full")
+
+        with mock.patch.object(config.yaml, "dump", dump_then_crash):
+            try:
+                config.update_condition(19, {"duration": 5})
+            except OSError:
+                pass
+        assert config.CONFIG_PATH.read_bytes() == before
+        assert list(config.CONFIG_PATH.parent.glob(".conditions.*")) == []
+        config._journal.clear()
+
+
+@test
+def test_debounced_edits_apply_at_once_and_save_together():
+    with _temp_config() as config:
+        config.CONFIG_SAVE_DEBOUNCE = 60.0
+        try:
+            before = config.CONFIG_PATH.read_bytes()
+            config.update_condition(19, {"duration": 5})
+            config.update_condition(21, {"duration": 6})
+            assert config.get_conditions()[19]["duration"] == 5
+            assert config.CONFIG_PATH.read_bytes() == before
+            config.save_conditions()
+        finally:
+            config.CONFIG_SAVE_DEBOUNCE = 0.0
+        saved = {c["id"]: c for c in yaml.safe_load(config.CONFIG_PATH.read_text())["conditions"]}
+        assert saved[19]["duration"] == 5 and saved[21]["duration"] == 6
+        assert config._journal == [] and config._flush_timer is None
+
+
+@test
+def test_failed_save_rolls_the_edit_back():
+    from unittest import mock
+    with _temp_config() as config:
+        before = config.CONFIG_PATH.read_bytes()
+        duration = config.get_conditions()[19].get("duration")
+        with mock.patch.object(config, "_write_atomic", side_effect=OSError("disk full")):
+            try:
+                config.update_condition(19, {"duration": 99})
+                raise AssertionError("failed save not reported")
+            except OSError:
+                pass
+        assert config.get_conditions()[19].get("duration") == duration
+        assert config.get_condition(19).duration == duration
+        assert config.CONFIG_PATH.read_bytes() == before and config._journal == []
+
+
+# ---------------------------------------------------------------------------
+# Compiled conditions
+# ---------------------------------------------------------------------------
+
+@test
+def test_invalid_edit_is_rejected_and_changes_nothing():
+    from triage.conditions import ConditionError
+    with _temp_config() as config:
+        before = config.CONFIG_PATH.read_bytes()
+        try:
+            config.update_condition(19, {"cycle_days": "mid-cycle"})
+            raise AssertionError("invalid cycle_days accepted")
+        except ConditionError as e:
+            assert "condition 19" in str(e)
+        assert config.get_conditions()[19].get("cycle_days") != "mid-cycle"
+        assert config.CONFIG_PATH.read_bytes() == before and config._journal == []
+
+
+@test
+def test_malformed_confirmation_template_is_rejected():
+    from triage.conditions import ConditionError
+    with _temp_config() as config:
+        for lab in ("Blood test {", "Test for {patient_age}", "Bring {lab.__class__}", "{lab:d}"):
+            try:
+                config.update_condition(19, {"confirmation_template": {"en": {"lab": lab}}})
+                raise AssertionError(f"template {lab!r} accepted")
+            except ConditionError as e:
+                assert "confirmation_template en.lab" in str(e), e
+        try:
+            config.update_condition(19, {"confirmation_template": {"en": {"diet": "x"}}})
+            raise AssertionError("unknown template line accepted")
+        except ConditionError:
+            pass
+        config.update_condition(19, {"confirmation_template": {"en": {"lab": "{lab} ({{fasting}})"}}})
+        assert config.get_condition(19).confirmation_template["en"]["lab"] == "{lab} ({{fasting}})"
+
+
+@test
+def test_invalid_file_keeps_loaded_conditions():
+    with _temp_config() as config:
+        data = yaml.safe_load(config.CONFIG_PATH.read_text())
+        data["conditions"][0]["lab"] = {"condition": "sometimes", "description": "x"}
+        config.CONFIG_PATH.write_text(yaml.dump(data, allow_unicode=True, sort_keys=False))
+        config._next_check = 0.0
+        assert config.get_condition(data["conditions"][0]["id"]) is not None
+        assert len(config.get_conditions()) == len(data["conditions"])
+
+
+@test
+def test_tools_read_compiled_conditions():
+    import json
+    from triage.tools import get_lab_requirements, calculate_cycle_window
+    with _temp_config() as config:
+        config.update_condition(19, {"lab": {"condition": "age_under_40", "test": "x", "description": "y"}})
+        assert json.loads(get_lab_requirements(19, 45)) == {
+            "lab_required": False, "reason": "Patient is 40 or older, lab not required."}
+        assert json.loads(get_lab_requirements(19, 35))["test"] == "x"
+        config.update_condition(19, {"cycle_days": "just_before_next_period"})
+        window = json.loads(calculate_cycle_window("2026-01-01", 19, 30))
+        assert window["valid_start"] == "2026-01-28" and window["valid_end"] == "2026-01-30"
+
+
+@test
+def test_typed_lookups_back_the_json_tools():
+    import json
+    from datetime import date
+    from triage.tools import cycle_window, lab_requirements, calculate_cycle_window, get_lab_requirements
+    with _temp_config() as config:
+        config.update_condition(19, {"cycle_days": [5, 10], "lab": {"tests": ["a", "b"], "description": "c"}})
+        window = cycle_window(date(2026, 1, 1), 19)
+        assert window.window_passed and window.next_valid_start == date(2026, 2, 2)
+        assert json.loads(calculate_cycle_window("2026-01-01", 19)) == window.to_dict()
+        lab = lab_requirements(19, 50)
+        assert lab.lab_required and lab.details == "a, b. c"
+        assert json.loads(get_lab_requirements(19, 50))["test"] == ["a", "b"]
+
+
+# ---------------------------------------------------------------------------
+# Triage instructions
+# ---------------------------------------------------------------------------
+
+@test
+def test_triage_instructions_cached_until_conditions_change():
+    from triage.agents import _build_triage_instructions
+    with _temp_config() as config:
+        first = _build_triage_instructions()
+        assert _build_triage_instructions() is first
+        prefix = first[:first.index("=== TODAY'S DATE ===")]
+        assert prefix.endswith(config.get_condition_reference() + "\n\n")
+        config.update_condition(19, {"name": "Renamed here"})
+        second = _build_triage_instructions()
+        assert second is not first and "Renamed here" in second
+
+
+@test
+def test_single_edit_rerenders_only_its_fragment():
+    with _temp_config() as config:
+        before = dict(config._fragments)
+        config.update_condition(21, {"name": "Edited", "category": "A"})
+        changed = [cid for cid in before if config._fragments[cid] != before[cid]]
+        assert changed == [21] and config._fragments[21][0] == "A"
+        assert list(config._fragments) == list(before)  # order kept
+        assert config.get_condition_reference() == config.build_condition_reference()
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def run():
+    failed = 0
+    for fn in _TESTS:
+        try:
+            fn()
+            print(f"PASS {fn.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {fn.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {fn.__name__}: {e!r}")
+    print(f"\n{len(_TESTS) - failed}/{len(_TESTS)} passed")
+    return failed
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(1 if run() else 0)
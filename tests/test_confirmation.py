@@ -164,6 +164,32 @@ def test_expiry_derived_and_confirm_returns_expired():
     assert s.confirm_by_token(tok)["status"] == "expired"
 
 
+@test
+def test_confirm_by_token_uses_token_index():
+    s = _store()
+    plan = s._db.connection().execute(
+        "EXPLAIN QUERY PLAN SELECT session_id FROM sessions WHERE confirmation_token = ?", ("x",)
+    ).fetchall()
+    assert any("idx_sessions_confirmation_token" in r[3] for r in plan), plan
+
+
+@test
+def test_purge_stale_tokens_keeps_recent_links():
+    from triage.config import CONFIRMATION_TTL_HOURS, CONFIRMATION_TOKEN_RETENTION_HOURS
+    s = _store(); _seed_booking(s, "s1"); _seed_booking(s, "s2")
+    stale = s.mark_booked("s1")["token"]
+    fresh = s.mark_booked("s2")["token"]
+    old = (datetime.now(timezone.utc) - timedelta(
+        hours=CONFIRMATION_TTL_HOURS + CONFIRMATION_TOKEN_RETENTION_HOURS + 1)).isoformat()
+    with sqlite3.connect(s.db_path) as c:
+        c.execute("UPDATE sessions SET confirmation_sent_at=? WHERE session_id='s1'", (old,))
+        c.commit()
+    assert s.purge_stale_tokens() == 1
+    assert s.confirm_by_token(stale)["status"] == "invalid"
+    assert s.get_session("s1")["confirmation"] == "expired"
+    assert s.confirm_by_token(fresh)["status"] == "confirmed"
+
+
 @test
 def test_cancel_booking_sets_cancelled():
     s = _store(); _seed_booking(s)
@@ -194,7 +220,7 @@ def test_confirm_route_public_and_confirms():
         print("  (skipped: TestClient/httpx unavailable)")
         return
     import triage.api as api_mod
-    from triage.session_store import SessionStore
+    from triage.session_store import SessionStore, AsyncSessionStore
 
     d = tempfile.mkdtemp()
     temp = SessionStore(Path(d) / "dash.db")
@@ -203,7 +229,7 @@ def test_confirm_route_public_and_confirms():
     temp.save_result("apis1", json.dumps({"triage": {"phone_number": "12345678", "language": "da"}}))
 
     orig = api_mod.store
-    api_mod.store = temp
+    api_mod.store = AsyncSessionStore(temp)
     try:
         client = TestClient(api_mod.app)
         # /book requires auth -> 401 without cookie
@@ -218,6 +244,63 @@ def test_confirm_route_public_and_confirms():
         api_mod.store = orig
 
 
+# ---------------------------------------------------------------------------
+# Templated confirmation text (no LLM)
+# ---------------------------------------------------------------------------
+
+def _render(**kw):
+    from triage.confirmation import render_confirmation
+    from triage.orchestrator import enrich_booking
+    triage = _booking_data(**kw)
+    return render_confirmation(triage, enrich_booking(triage))
+
+
+@test
+def test_render_confirmation_danish_uses_condition_template():
+    text = _render(condition_id=19, language="da", patient_name="Mette", patient_age=25)
+    assert text is not None
+    assert text.startswith("Tak, Mette!"), text
+    assert "klamydiatest" in text and "12345678" in text, text
+    assert "Lab required" not in text, text
+
+
+@test
+def test_render_confirmation_english_cycle_window_dates():
+    text = _render(condition_id=19, language="en", patient_age=35, last_period_date="2026-03-01")
+    assert text is not None and "chlamydia" not in text, text
+    assert "between" in text, text
+
+
+@test
+def test_render_confirmation_lab_line_does_not_assume_unknown_age():
+    for language in ("da", "en"):
+        text = _render(condition_id=19, language=language, patient_age=None)
+        assert text is not None and "under 30" in text, text
+        assert "As you are" not in text and "Da du er" not in text, text
+
+
+@test
+def test_render_confirmation_falls_back_when_untemplated():
+    from triage.config import get_condition
+    assert _render(condition_id=19, language="uk", patient_age=25) is None
+    cond = get_condition(42)
+    cond.preparation_instructions = ("Fast for 6 hours",)
+    try:
+        assert _render(language="da") is None
+        assert "Fast for 6 hours" in _render(language="en")
+    finally:
+        cond.preparation_instructions = ()
+
+
+@test
+def test_process_completed_triage_skips_agent_when_templated():
+    import asyncio
+    from triage.orchestrator import process_completed_triage
+    booking, confirmation = asyncio.run(process_completed_triage(_booking_data(language="da"), None))
+    assert booking.triage.condition_id == 42
+    assert isinstance(confirmation, str) and "Venlig hilsen" in confirmation, confirmation
+
+
 # ---------------------------------------------------------------------------
 # Runner
 # ---------------------------------------------------------------------------
@@ -0,0 +1,493 @@
+"""Standalone verification for the SessionStore / SQLite connection layer.
+
+Run: python -m tests.test_session_store
+No LLM, no network — pure SQLite.
+"""
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+_TESTS = []
+
+
+def test(fn):
+    _TESTS.append(fn)
+    return fn
+
+
+def _store():
+    from triage.session_store import SessionStore
+    d = tempfile.mkdtemp()
+    return SessionStore(Path(d) / "dash.db")
+
+
+# ---------------------------------------------------------------------------
+# Connection pool
+# ---------------------------------------------------------------------------
+
+@test
+def test_pool_uses_wal_and_normal_sync():
+    s = _store()
+    conn = s._db.connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+@test
+def test_pool_reuses_connection_per_thread():
+    s = _store()
+    assert s._db.connection() is s._db.connection()
+    other = []
+    t = threading.Thread(target=lambda: other.append(s._db.connection()))
+    t.start(); t.join()
+    assert other[0] is not s._db.connection()
+
+
+@test
+def test_transaction_rolls_back_on_error():
+    s = _store()
+    s.create_session("s1")
+    try:
+        with s._db.transaction() as conn:
+            conn.execute("UPDATE sessions SET status='completed' WHERE session_id='s1'")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert s.get_session("s1")["status"] == "active"
+
+
+@test
+def test_writes_visible_to_fresh_store():
+    s = _store()
+    s.create_session("s1")
+    s.save_result("s1", json.dumps({"triage": {"phone_number": "1"}}))
+    from triage.session_store import SessionStore
+    assert SessionStore(s.db_path).get_result("s1") == {"triage": {"phone_number": "1"}}
+
+
+# ---------------------------------------------------------------------------
+# Completion write
+# ---------------------------------------------------------------------------
+
+@test
+def test_record_completion_writes_all_fields():
+    s = _store()
+    s.create_session("s1")
+    triage = {"patient_name": "Anna", "condition_name": "Cone biopsy", "phone_number": "1"}
+    s.record_completion("s1", triage, {"triage": triage}, "normal", result_type="booking")
+    row = s.get_session("s1")
+    assert row["status"] == "completed" and row["result_type"] == "booking"
+    assert row["patient_name"] == "Anna" and row["condition_name"] == "Cone biopsy"
+    assert row["urgency"] == "normal"
+    assert s.get_result("s1") == {"triage": triage}
+
+
+@test
+def test_record_completion_handoff_is_escalated():
+    s = _store()
+    s.create_session("s1")
+    s.record_completion("s1", {}, {"urgency": "immediate"}, "immediate", result_type="handoff")
+    row = s.get_session("s1")
+    assert row["status"] == "escalated" and row["urgency"] == "immediate"
+
+
+@test
+def test_record_completion_takes_result_type_at_its_word():
+    s = _store()
+    for sid in ("s1", "s2"):
+        s.create_session(sid)
+    # A handoff that happens to lack a summary is still a handoff; the type is never guessed
+    s.record_completion("s1", {}, {"reason": "DSS"}, "high", result_type="handoff")
+    s.record_completion("s2", {}, {"triage": {}, "conversation_summary": "x"}, "normal")
+    assert (s.get_session("s1")["status"], s.get_session("s1")["result_type"]) == ("escalated", "handoff")
+    assert (s.get_session("s2")["status"], s.get_session("s2")["result_type"]) == ("completed", "booking")
+    try:
+        s.record_completion("s2", {}, {}, "normal", result_type="text")
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+@test
+def test_patch_result_merges_late_summary():
+    s = _store()
+    s.create_session("s1")
+    result = {"reason": "Bleeding", "urgency": "immediate", "conversation_summary": "fast"}
+    s.record_completion("s1", {}, result, "immediate", result_type="handoff")
+    s.patch_result("s1", {"conversation_summary": "from agent"})
+    assert s.get_result("s1") == {**result, "conversation_summary": "from agent"}
+
+
+@test
+def test_category_a_handoff_is_immediate_without_agent():
+    import asyncio
+    from triage.models import TriageData
+    from triage.orchestrator import process_completed_triage
+
+    async def go():
+        triage = TriageData(category="A", condition_name="Ectopic pregnancy", phone_number="1")
+        handoff, task = await process_completed_triage(triage, None)
+        task.cancel()  # the handoff agent runs in the background; not under test here
+        return handoff
+
+    handoff = asyncio.run(go())
+    assert handoff.urgency == "immediate" and handoff.reason == "Category A urgent condition"
+    assert "Ectopic pregnancy" in handoff.conversation_summary
+
+
+@test
+def test_every_escalation_returns_before_the_handoff_agent():
+    import asyncio
+    from triage.models import TriageData
+    from triage.orchestrator import process_completed_triage
+
+    async def go(triage):
+        handoff, task = await process_completed_triage(triage, None)
+        assert isinstance(task, asyncio.Task) and not task.done()
+        task.cancel()
+        return handoff
+
+    dss = asyncio.run(go(TriageData(insurance_type="dss", phone_number="1")))
+    asked = asyncio.run(go(TriageData(escalate=True, escalation_reason="Wants a doctor", phone_number="1")))
+    assert dss.urgency == "high" and dss.reason == "DSS/private insurance"
+    assert asked.reason == "Wants a doctor" and "Wants a doctor" in asked.conversation_summary
+
+
+# ---------------------------------------------------------------------------
+# Denormalised contact columns
+# ---------------------------------------------------------------------------
+
+def _complete(s, sid, doctor="HS", phone="12345678", cpr="010190-1234"):
+    s.create_session(sid)
+    triage = {"phone_number": phone, "cpr_number": cpr, "doctor": doctor}
+    s.record_completion(sid, triage, {"triage": triage}, "normal", result_type="booking")
+
+
+@test
+def test_inbox_reads_contact_columns_and_filters_by_doctor():
+    s = _store()
+    _complete(s, "s1", doctor="HS")
+    _complete(s, "s2", doctor="LB", phone="87654321")
+    rows = {r["session_id"]: r for r in s.list_inbox()}
+    assert rows["s2"]["phone"] == "87654321" and rows["s1"]["cpr"] == "010190-1234"
+    assert [r["session_id"] for r in s.list_inbox(doctor="LB")] == ["s2"]
+
+
+@test
+def test_migration_backfills_contact_columns():
+    import sqlite3
+    d = tempfile.mkdtemp()
+    path = Path(d) / "old.db"
+    with sqlite3.connect(path) as c:
+        c.execute(
+            "CREATE TABLE sessions (session_id TEXT PRIMARY KEY, created_at TEXT NOT NULL, "
+            "patient_name TEXT, status TEXT NOT NULL DEFAULT 'active', condition_name TEXT, "
+            "result_type TEXT, result_json TEXT)"
+        )
+        c.execute(
+            "INSERT INTO sessions VALUES ('old', '2026-01-01T00:00:00+00:00', 'A', 'completed', "
+            "'X', 'booking', ?)",
+            (json.dumps({"triage": {"phone_number": "111", "cpr_number": "c", "doctor": "LB"}}),),
+        )
+        c.execute(
+            "INSERT INTO sessions VALUES ('bad', '2026-01-01T00:00:00+00:00', 'B', 'completed', "
+            "'X', 'booking', 'not json')"
+        )
+    from triage.session_store import SessionStore
+    rows = {r["session_id"]: r for r in SessionStore(path).list_inbox()}
+    assert (rows["old"]["phone"], rows["old"]["cpr"], rows["old"]["doctor"]) == ("111", "c", "LB")
+    assert rows["bad"]["phone"] is None
+
+
+# ---------------------------------------------------------------------------
+# Inbox pagination
+# ---------------------------------------------------------------------------
+
+@test
+def test_page_inbox_walks_all_rows_in_order():
+    s = _store()
+    for i in range(7):
+        _complete(s, f"s{i}")
+        s.set_urgency(f"s{i}", ["immediate", "high", "normal"][i % 3])
+    seen, cursor = [], None
+    while True:
+        page = s.page_inbox(limit=2, cursor=cursor)
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert [r["session_id"] for r in seen] == [r["session_id"] for r in s.list_inbox()]
+    assert len({r["session_id"] for r in seen}) == 7
+    ranks = [r["urgency_rank"] for r in seen]
+    assert ranks == sorted(ranks)
+
+
+@test
+def test_page_inbox_filters():
+    s = _store()
+    _complete(s, "s1", doctor="HS")
+    _complete(s, "s2", doctor="LB")
+    s.set_processing("s2", "done")
+    s.mark_booked("s1")
+    assert [r["session_id"] for r in s.page_inbox(processing_status=["done"])["items"]] == ["s2"]
+    assert [r["session_id"] for r in s.page_inbox(confirmation="pending")["items"]] == ["s1"]
+    assert [r["session_id"] for r in s.page_inbox(confirmation="none")["items"]] == ["s2"]
+    assert s.page_inbox(since="2999-01-01")["items"] == []
+
+
+@test
+def test_page_inbox_closed_splits_active_from_done_and_cancelled():
+    s = _store()
+    for sid in ("s1", "s2", "s3"):
+        _complete(s, sid)
+    s.set_processing("s2", "done")
+    s.mark_booked("s3")
+    s.cancel_booking("s3")  # cancelled but never marked done
+    assert [r["session_id"] for r in s.page_inbox(closed=False)["items"]] == ["s1"]
+    assert sorted(r["session_id"] for r in s.page_inbox(closed=True)["items"]) == ["s2", "s3"]
+
+
+@test
+def test_active_inbox_pages_use_the_open_index():
+    from triage.session_store import INBOX_COLUMNS, INBOX_ORDER
+    s = _store()
+    where, params = s._inbox_filters(None, None, None, None, None, False)
+    plans = []
+    for keyset in ("1", "urgency_rank = ? AND (created_at, session_id) < (?, ?)", "urgency_rank > ?"):
+        plans += [row[-1] for row in s._db.connection().execute(
+            f"EXPLAIN QUERY PLAN SELECT {INBOX_COLUMNS} FROM sessions WHERE {where} AND {keyset} "
+            f"{INBOX_ORDER} LIMIT 50", params + [0] * keyset.count("?"))]
+    assert all("USING INDEX idx_sessions_inbox_open" in plan for plan in plans), plans
+    assert all("TEMP B-TREE" not in plan for plan in plans), plans
+
+
+@test
+def test_page_inbox_rejects_bad_cursor():
+    s = _store()
+    try:
+        s.page_inbox(cursor="garbage")
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+@test
+def test_inbox_change_feed_skips_own_worker():
+    s = _store()
+    last, changed = s.inbox_changes_since(None, "w1")
+    s.log_inbox_change("s1", "w1")
+    s.log_inbox_change("s2", "w2")
+    s.log_inbox_change("s2", "w2")
+    last, changed = s.inbox_changes_since(last, "w1")
+    assert changed == ["s2"], changed
+    assert s.inbox_changes_since(last, "w1") == (last, [])
+
+
+# ---------------------------------------------------------------------------
+# Triage history (replay window, transcript)
+# ---------------------------------------------------------------------------
+
+def _chat(n):
+    items = []
+    for i in range(n):
+        items.append({"role": "user", "content": f"patient {i}"})
+        if i == 1:
+            items.append({"type": "function_call", "name": "fetch_condition_details", "call_id": "c1"})
+            items.append({"type": "function_call_output", "call_id": "c1", "output": '{"id": 19}'})
+        items.append({"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": f"agent {i}"}]})
+    return items
+
+
+@test
+def test_replay_window_is_bounded_and_keeps_state():
+    from triage.history import window_items
+    short = _chat(3)
+    assert window_items(short, 6) == short
+    for n in (20, 200):
+        replay = window_items(_chat(n), 6)
+        assert len(replay) == 7, len(replay)
+        assert replay[0]["role"] == "developer"
+        assert "Patient: patient 0" in replay[0]["content"] and '{"id": 19}' in replay[0]["content"]
+        assert replay[1] == {"role": "user", "content": f"patient {n - 3}"}
+
+
+@test
+def test_replay_state_lists_collected_fields_from_the_middle():
+    from triage.history import window_items
+    items = _chat(40)
+    items[40:40] = [
+        {"type": "message", "role": "assistant", "content": "Do you have a referral from your doctor?"},
+        {"role": "user", "content": "Yes I do. My CPR is 0101901234 and you can reach me on +45 12 34 56 78"},
+        {"type": "function_call", "name": "fetch_condition_details", "call_id": "c2"},
+        {"type": "function_call_output", "call_id": "c2", "output": '{"id": 19, "name": "Chlamydia", "doctor": "LB"}'},
+        {"type": "function_call", "name": "complete_triage", "call_id": "c3",
+         "arguments": '{"data": {"has_referral": true, "patient_age": 27}}'},
+        {"type": "function_call_output", "call_id": "c3", "output": "ERROR: cpr_number is required"},
+    ]
+    state = window_items(items, 6)[0]["content"]
+    collected, _, rest = state.partition("UNCONFIRMED")
+    assert "patient 20" not in state  # clipped out of the excerpt...
+    for line in ("has_referral: true", "patient_age: 27", "condition_id: 19", 'doctor: "LB"'):
+        assert line in collected, (line, state)  # ...but listed from the tool calls
+    assert "cpr_number" not in collected and "cpr_number? 010190-1234" in rest, state
+    assert "phone_number? 12345678" in rest, state
+
+
+@test
+def test_replay_state_does_not_guess_fields_from_free_text():
+    from triage.history import collected_fields, window_items
+    answers = [
+        ("Hvor længe har du haft den?", "Jeg har haft min spiral i 8 år"),
+        ("Hvad kalder din læge det?", "Jeg har haft det i 3 uger"),
+        ("Anything else?", "I had 2 children, the last one 5 years old now"),
+        ("Do you have a referral from your doctor?", "No, but my GP will send it"),
+    ]
+    items = []
+    for question, answer in answers * 5:
+        items += [{"type": "message", "role": "assistant", "content": question},
+                  {"role": "user", "content": answer}]
+    assert collected_fields(items) == {}
+    state = window_items(items, 4)[0]["content"]
+    assert "do not ask" not in state and "UNCONFIRMED" not in state, state
+
+
+@test
+def test_internal_view_reads_full_history_without_recording():
+    import asyncio
+    from triage.history import TriageSession
+
+    async def go():
+        session = TriageSession("s1", Path(tempfile.mkdtemp()) / "sdk.db", max_messages=4)
+        await session.add_items(_chat(5))
+        internal = session.internal_view()
+        await internal.add_items([{"role": "user", "content": "handoff prompt"}])
+        return len(await session.get_items()), len(await internal.get_items())
+
+    replayed, full = asyncio.run(go())
+    assert replayed == 5 and full == 12, (replayed, full)
+
+
+@test
+def test_legacy_internal_rows_migrated_out_of_transcript():
+    import asyncio
+    from triage.history import TriageSession, migrate_sdk_history
+    from triage.session_store import SessionStore
+    d = Path(tempfile.mkdtemp())
+    handoff = '{"triage": {}, "conversation_summary": "..."}'
+    legacy = _chat(2) + [
+        {"role": "user", "content": "Triage data collected so far: {...}"},
+        {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": handoff}]},
+        {"role": "user", "content": "Patient language: da\nBooking: ..."},
+        {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "Tak! Vi ringer."}]},
+    ]
+    asyncio.run(TriageSession("s1", d / "triage_sessions.db").add_items(legacy))
+    migrate_sdk_history(d / "triage_sessions.db")
+    migrate_sdk_history(d / "triage_sessions.db")  # idempotent
+    conversation = SessionStore(d / "dash.db").get_conversation("s1")
+    assert [m["content"] for m in conversation] == [
+        "patient 0", "agent 0", "patient 1", "agent 1", "Tak! Vi ringer."], conversation
+
+
+@test
+def test_confirmation_reply_reaches_staff_transcript():
+    import asyncio
+    from triage.history import TriageSession
+    from triage.orchestrator import record_reply
+    from triage.session_store import SessionStore
+    d = Path(tempfile.mkdtemp())
+    sdk = str(d / "triage_sessions.db")
+    asyncio.run(TriageSession("s1", sdk).add_items(_chat(1)))
+    asyncio.run(record_reply("s1", "Thank you! The clinic will call you.", sdk))
+    conversation = SessionStore(d / "dash.db").get_conversation("s1")
+    assert conversation[-1]["role"] == "assistant", conversation
+    assert conversation[-1]["content"] == "Thank you! The clinic will call you."
+
+
+@test
+def test_conversation_reader_tails_and_parses_only_new_rows():
+    import asyncio
+    from unittest import mock
+    from triage import session_store
+    from triage.history import TriageSession
+    d = Path(tempfile.mkdtemp())
+    sdk = TriageSession("s1", d / "triage_sessions.db")
+    asyncio.run(sdk.add_items(_chat(2)))
+    s = session_store.SessionStore(d / "dash.db")
+    first = s.get_conversation("s1")
+    assert [m["content"] for m in first] == ["patient 0", "agent 0", "patient 1", "agent 1"]
+    asyncio.run(sdk.add_items([{"role": "user", "content": "more"}]))
+    with mock.patch.object(session_store, "_transcript_message", wraps=session_store._transcript_message) as parse:
+        tail = s.get_conversation("s1", after=first[-1]["id"])
+    assert [m["content"] for m in tail] == ["more"] and parse.call_count == 1
+    assert len(s.get_conversation("s1")) == 5
+
+
+# ---------------------------------------------------------------------------
+# Async facade
+# ---------------------------------------------------------------------------
+
+@test
+def test_async_store_runs_off_event_loop():
+    import asyncio
+    from triage.session_store import AsyncSessionStore
+    s = _store()
+    a = AsyncSessionStore(s)
+    seen = []
+    list_inbox = s.list_inbox
+    s.list_inbox = lambda *a: seen.append(threading.get_ident()) or list_inbox(*a)
+
+    async def go():
+        await a.create_session("s1")
+        await a.record_completion("s1", {"patient_name": "A"}, {}, "normal", result_type="booking")
+        return await asyncio.gather(a.list_inbox(), a.get_session("s1"))
+
+    rows, session = asyncio.run(go())
+    a.close()
+    assert [r["session_id"] for r in rows] == ["s1"]
+    assert session["patient_name"] == "A"
+    assert seen and seen[0] != threading.get_ident()
+
+
+@test
+def test_async_store_counts_contention():
+    import asyncio
+    from triage.session_store import AsyncSessionStore
+    a = AsyncSessionStore(_store())
+
+    async def go():
+        await a.create_session("s1")
+        await a.record_completion("s1", {"patient_name": "A"}, {}, "normal", result_type="booking")
+        await asyncio.gather(*(a.get_session("s1") for _ in range(5)))
+
+    asyncio.run(go())
+    a.close()
+    stats = a.stats()
+    assert stats["write"]["calls"] == 2 and stats["read"]["calls"] == 5, stats
+    assert 0 < stats["write"]["run_max"] <= stats["write"]["run_seconds"], stats
+    assert stats["write_lock"]["transactions"] >= 1 and stats["write_lock"]["busy_errors"] == 0, stats
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def run():
+    failed = 0
+    for fn in _TESTS:
+        try:
+            fn()
+            print(f"PASS {fn.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {fn.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {fn.__name__}: {e!r}")
+    print(f"\n{len(_TESTS) - failed}/{len(_TESTS)} passed")
+    return failed
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(1 if run() else 0)
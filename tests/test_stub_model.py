@@ -0,0 +1,147 @@
+"""Standalone verification for the offline stub model provider.
+
+Run: python -m tests.test_stub_model
+No LLM, no network — scripted model replies over a temporary SDK session database.
+"""
+import tempfile
+from pathlib import Path
+
+_TESTS = []
+
+
+def test(fn):
+    _TESTS.append(fn)
+    return fn
+
+
+# ---------------------------------------------------------------------------
+# Script helpers
+# ---------------------------------------------------------------------------
+
+@test
+def test_parse_latency_accepts_fixed_and_range():
+    from triage.stub_model import parse_latency
+    assert parse_latency("400") == (0.4, 0.4)
+    assert parse_latency("200-800") == (0.2, 0.8)
+    assert parse_latency("0") == (0.0, 0.0)
+
+
+@test
+def test_position_counts_user_turns_and_tool_steps():
+    from triage.stub_model import _position
+    items = [
+        {"role": "user", "content": "hi"},
+        {"type": "message", "role": "assistant", "content": "hello"},
+        {"role": "user", "content": "cystoscopy"},
+        {"type": "function_call", "name": "fetch_condition_details", "call_id": "c1"},
+        {"type": "function_call_output", "call_id": "c1", "output": "{}"},
+    ]
+    assert _position(items) == (1, 1)
+    assert _position([]) == (0, 0)
+
+
+# ---------------------------------------------------------------------------
+# A whole booking without the network
+# ---------------------------------------------------------------------------
+
+@test
+def test_stub_model_drives_a_booking_end_to_end():
+    import asyncio
+    from triage.agents import triage_agent
+    from triage.orchestrator import run_agent_turn
+    from triage.stub_model import DEFAULT_SCRIPT, StubModel
+    db = str(Path(tempfile.mkdtemp()) / "sdk.db")
+    original, triage_agent.model = triage_agent.model, StubModel(DEFAULT_SCRIPT["triage"])
+
+    async def conversation():
+        return [await run_agent_turn("stub1", m, db) for m in ("cystoscopy please", "yes", "010190-1234")]
+
+    try:
+        first, second, last = asyncio.run(conversation())
+    finally:
+        triage_agent.model = original
+    assert first["type"] == "text" and "referral" in first["content"], first
+    assert second["type"] == "text"
+    assert last["type"] == "booking" and last["triage_data"]["condition_id"] == 42, last
+
+
+@test
+def test_streamed_turn_sends_progress_then_text():
+    import asyncio
+    from triage.agents import triage_agent
+    from triage.orchestrator import run_agent_turn
+    from triage.stub_model import DEFAULT_SCRIPT, StubModel
+    db = str(Path(tempfile.mkdtemp()) / "sdk.db")
+    original, triage_agent.model = triage_agent.model, StubModel(DEFAULT_SCRIPT["triage"])
+    frames = []
+
+    async def on_event(frame):
+        frames.append(frame)
+
+    try:
+        result = asyncio.run(run_agent_turn("stream1", "cystoscopy please", db, on_event=on_event))
+    finally:
+        triage_agent.model = original
+    assert [f["type"] for f in frames][:1] == ["tool_progress"], frames
+    assert frames[0]["data"]["tool"] == "fetch_condition_details"
+    assert {f["type"] for f in frames[1:]} == {"chat_delta"}, frames
+    assert "".join(f["data"]["delta"] for f in frames[1:]) == result["content"], (frames, result)
+    assert result["type"] == "text" and result["partial"]["condition_id"] == 42, result
+
+
+@test
+def test_streamed_turn_is_cancelled_when_a_frame_cannot_be_sent():
+    import asyncio
+    from unittest import mock
+    from triage import orchestrator
+    from triage.agents import triage_agent
+    from triage.stub_model import DEFAULT_SCRIPT, StubModel
+    db = str(Path(tempfile.mkdtemp()) / "sdk.db")
+    original, triage_agent.model = triage_agent.model, StubModel(DEFAULT_SCRIPT["triage"])
+    runs = []
+    run_streamed = orchestrator.Runner.run_streamed
+
+    def spy(*args, **kwargs):
+        runs.append(run_streamed(*args, **kwargs))
+        return runs[-1]
+
+    async def closed_socket(frame):
+        raise ConnectionError("socket closed")
+
+    async def turn():
+        with mock.patch.object(orchestrator.Runner, "run_streamed", side_effect=spy):
+            await orchestrator.run_agent_turn("stream2", "cystoscopy please", db, on_event=closed_socket)
+
+    try:
+        asyncio.run(turn())
+        raise AssertionError("send failure swallowed")
+    except ConnectionError:
+        pass
+    finally:
+        triage_agent.model = original
+    assert runs[0].is_complete and runs[0]._cancel_mode == "immediate"
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def run():
+    failed = 0
+    for fn in _TESTS:
+        try:
+            fn()
+            print(f"PASS {fn.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {fn.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {fn.__name__}: {e!r}")
+    print(f"\n{len(_TESTS) - failed}/{len(_TESTS)} passed")
+    return failed
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(1 if run() else 0)
@@ -0,0 +1,255 @@
+"""Record-and-replay cassettes for war games.
+
+A recording run saves every model exchange of a scenario: the patient simulator's
+chat completions and the triage/handoff agents' model calls. Each exchange is stored
+under a stable hash of its request, in tests/war_games/cassettes/<scenario>.json.
+A replay run serves the responses from disk with no network and no API key, so the
+suite re-runs in seconds after changes to enrichment, validation or conditions.yaml.
+
+Each kind of exchange ("patient", "triage", "handoff") is replayed in recorded
+order. When a request no longer hashes to what was recorded, the recorded response
+is still served and the call is reported as drift, naming the parts that changed.
+Drift usually means a prompt, the condition reference or a tool output changed.
+Today's date is left out of the hash so cassettes stay valid on later days.
+
+Agent calls are covered in both runner modes. A streamed call (Runner.run_streamed,
+as the web app's turns use) is recorded from its final response and replayed as the
+SDK's normalized stream events for that response.
+"""
+
+import contextvars
+import hashlib
+import json
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+from agents import OpenAIProvider
+from agents.agent_output import AgentOutputSchemaBase
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from agents.usage import Usage
+from openai.types.responses import ResponseOutputItem
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+from pydantic import TypeAdapter
+
+CASSETTE_DIR = Path(__file__).resolve().parent / "cassettes"
+CASSETTE_VERSION = 1
+_TODAY = re.compile(r"\n\n=== TODAY'S DATE ===.*\Z", re.S)
+_OUTPUT_ITEM = TypeAdapter(ResponseOutputItem)
+
+# The cassette of the scenario running in this asyncio task (None = live)
+_current: contextvars.ContextVar["Cassette | None"] = contextvars.ContextVar("cassette", default=None)
+
+
+class CassetteError(Exception):
+    """A model exchange could not be recorded or replayed."""
+
+
+class CassetteMiss(CassetteError):
+    """Replay asked for more exchanges of a kind than were recorded."""
+
+
+def _hash(value) -> str:
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+class Cassette:
+    """The recorded exchanges of one scenario; mode is "record" or "replay"."""
+
+    def __init__(self, scenario: str, mode: str, directory: Path = CASSETTE_DIR):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self.scenario = scenario
+        self.mode = mode
+        self.path = Path(directory) / f"{scenario}.json"
+        self.drift: list[dict] = []
+        self._recorded: dict[str, list[dict]] = {}
+        self._cursor: dict[str, int] = {}
+        if mode == "replay":
+            if not self.path.exists():
+                raise CassetteMiss(f"no cassette for {scenario}; record one with --record")
+            data = json.loads(self.path.read_text())
+            for entry in data["interactions"]:
+                self._recorded.setdefault(entry["kind"], []).append(entry)
+
+    @contextmanager
+    def active(self):
+        """Route model calls made in this context (and tasks it starts) through the cassette."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def save(self):
+        interactions = [e for entries in self._recorded.values() for e in entries]
+        interactions.sort(key=lambda e: e["seq"])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({
+            "version": CASSETTE_VERSION, "scenario": self.scenario, "interactions": interactions,
+        }, indent=1, ensure_ascii=False))
+
+    async def exchange(self, kind: str, parts: dict, call):
+        """The response for a request made of parts: from disk (replay) or from
+        awaiting call() and storing it (record). Responses are JSON-able."""
+        if self.mode == "record":
+            response = await call()
+            self.record(kind, parts, response)
+            return response
+        return self.replay(kind, parts)
+
+    def record(self, kind: str, parts: dict, response):
+        parts_hash = {name: _hash(value) for name, value in parts.items()}
+        seq = sum(len(v) for v in self._recorded.values())
+        self._recorded.setdefault(kind, []).append(
+            {"seq": seq, "kind": kind, "key": _hash(parts_hash), "parts": parts_hash, "response": response})
+
+    def replay(self, kind: str, parts: dict):
+        """The next recorded response of kind, noting drift if parts changed."""
+        parts_hash = {name: _hash(value) for name, value in parts.items()}
+        key = _hash(parts_hash)
+        index = self._cursor.get(kind, 0)
+        entries = self._recorded.get(kind, [])
+        if index >= len(entries):
+            raise CassetteMiss(f"{self.scenario}: {kind} call {index + 1} was never recorded")
+        self._cursor[kind] = index + 1
+        entry = entries[index]
+        if entry["key"] != key:
+            changed = sorted(n for n in parts_hash if entry["parts"].get(n) != parts_hash[n])
+            self.drift.append({"kind": kind, "call": index + 1, "changed": changed})
+        return entry["response"]
+
+
+async def chat(client, **request) -> str:
+    """Patient-simulator chat completion text, through the active cassette if any
+    (client is unused on replay and may be None)."""
+    async def call():
+        resp = await client.chat.completions.create(**request)
+        return resp.choices[0].message.content
+
+    cassette = _current.get()
+    if cassette is None:
+        return await call()
+    return await cassette.exchange("patient", {"model": request.get("model"), "messages": request["messages"]}, call)
+
+
+def _dump_response(response: ModelResponse) -> dict:
+    usage = response.usage
+    return {
+        "output": [item.model_dump(exclude_none=True) for item in response.output],
+        "usage": {
+            "requests": usage.requests,
+            "input_tokens": usage.input_tokens,
+            "cached_tokens": usage.input_tokens_details.cached_tokens,
+            "output_tokens": usage.output_tokens,
+            "reasoning_tokens": usage.output_tokens_details.reasoning_tokens,
+            "total_tokens": usage.total_tokens,
+        },
+        "response_id": response.response_id,
+    }
+
+
+def _dump_completed(response) -> dict:
+    """_dump_response() for the Responses API object of a stream's completed event."""
+    usage = response.usage
+    return {
+        "output": [item.model_dump(exclude_none=True) for item in response.output],
+        "usage": {
+            "requests": 1,
+            "input_tokens": usage.input_tokens if usage else 0,
+            "cached_tokens": usage.input_tokens_details.cached_tokens if usage else 0,
+            "output_tokens": usage.output_tokens if usage else 0,
+            "reasoning_tokens": usage.output_tokens_details.reasoning_tokens if usage else 0,
+            "total_tokens": usage.total_tokens if usage else 0,
+        },
+        "response_id": response.id,
+    }
+
+
+def _load_response(data: dict) -> ModelResponse:
+    u = data["usage"]
+    usage = Usage(
+        requests=u["requests"],
+        input_tokens=u["input_tokens"],
+        input_tokens_details=InputTokensDetails(cached_tokens=u["cached_tokens"], cache_write_tokens=0),
+        output_tokens=u["output_tokens"],
+        output_tokens_details=OutputTokensDetails(reasoning_tokens=u["reasoning_tokens"]),
+        total_tokens=u["total_tokens"],
+    )
+    output = [_OUTPUT_ITEM.validate_python(item) for item in data["output"]]
+    return ModelResponse(output=output, usage=usage, response_id=data["response_id"])
+
+
+class CassetteModel(Model):
+    """Wraps an agent's model. Inside Cassette.active() calls are recorded or replayed;
+    outside they go straight to the wrapped model."""
+
+    def __init__(self, kind: str, inner: str | Model):
+        self.kind = kind
+        self._inner = inner
+
+    @property
+    def inner(self) -> Model:
+        if isinstance(self._inner, str):  # resolved lazily: replay needs no API key
+            self._inner = OpenAIProvider().get_model(self._inner)
+        return self._inner
+
+    @staticmethod
+    def _parts(system_instructions, input, tools, output_schema) -> dict:
+        return {
+            "instructions": _TODAY.sub("", system_instructions or ""),
+            "input": input,
+            "tools": sorted(t.name for t in tools),
+            "output_schema": output_schema.name() if output_schema else None,
+        }
+
+    async def get_response(self, system_instructions, input, model_settings, tools,
+                           output_schema: AgentOutputSchemaBase | None, handoffs, tracing, **kwargs):
+        args = (system_instructions, input, model_settings, tools, output_schema, handoffs, tracing)
+        cassette = _current.get()
+        if cassette is None:
+            return await self.inner.get_response(*args, **kwargs)
+
+        async def call():
+            return _dump_response(await self.inner.get_response(*args, **kwargs))
+
+        parts = self._parts(system_instructions, input, tools, output_schema)
+        return _load_response(await cassette.exchange(self.kind, parts, call))
+
+    async def stream_response(self, system_instructions, input, model_settings, tools,
+                              output_schema: AgentOutputSchemaBase | None, handoffs, tracing, **kwargs):
+        args = (system_instructions, input, model_settings, tools, output_schema, handoffs, tracing)
+        cassette = _current.get()
+        if cassette is None:
+            async for event in self.inner.stream_response(*args, **kwargs):
+                yield event
+            return
+
+        parts = self._parts(system_instructions, input, tools, output_schema)
+        if cassette.mode == "replay":
+            # ScriptedModel turns the recorded response into the SDK's stream events
+            from agents.testing import ModelStep, ScriptedModel  # newer than the pinned openai-agents
+            response = _load_response(cassette.replay(self.kind, parts))
+            step = ModelStep(output=response.output, usage=response.usage, response_id=response.response_id)
+            async for event in ScriptedModel([step]).stream_response(*args, **kwargs):
+                yield event
+            return
+
+        completed = None
+        async for event in self.inner.stream_response(*args, **kwargs):
+            if event.type == "response.completed":
+                completed = event.response
+            yield event
+        if completed is None:
+            raise CassetteError(f"{cassette.scenario}: streamed {self.kind} call ended without a response")
+        cassette.record(self.kind, parts, _dump_completed(completed))
+
+
+def install():
+    """Wrap the triage and handoff agents' models so cassettes can see their calls."""
+    from triage.agents import handoff_agent, triage_agent
+    for kind, agent in (("triage", triage_agent), ("handoff", handoff_agent)):
+        if not isinstance(agent.model, CassetteModel):
+            agent.model = CassetteModel(kind, agent.model)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+WebSocket load test: many simulated patients against the real /ws/{session_id} endpoint.
+
+Each simulated patient logs in with the demo credentials' cookie, opens its own
+WebSocket and plays a war-game scenario as a fixed script (the opening, then a
+referral answer, then name, CPR and phone), waiting for each reply before sending
+the next message. Meant for a server on the offline stub model, so the numbers are
+the server's own (orchestration, stores, WebSocket), not the LLM's:
+
+    MODEL_PROVIDER=stub STUB_MODEL_LATENCY_MS=200-800 python main.py --workers 1
+    python -m tests.war_games.load_test --clients 50
+
+or let the harness start that server on a throwaway data directory:
+
+    python -m tests.war_games.load_test --spawn --clients 200 --latency 200-800
+
+Reports connection setup time, per-message reply latency percentiles, error rate
+and database contention (GET /api/stats/db, before vs after): the dashboard store's
+thread-pool queueing, run times (every write, lock waits included) and explicit
+transactions' write-lock waits, and the SDK session database's read/write times.
+The counters are per worker process: run the server with --workers 1 to see them all.
+
+Needs the dev requirements (pip install -r requirements-dev.txt).
+"""
+
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import os
+import subprocess
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+import websockets
+
+from tests.war_games.scenarios import SCENARIOS
+from tests.war_games.runner import percentile
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+REPLY_TYPES = ("chat", "complete")
+ERROR_PREFIX = "Sorry, an error occurred"
+
+
+def scenario_script(scenario: dict) -> list[str]:
+    """The patient messages one simulated patient sends for a scenario."""
+    opening = scenario.get("opening") or scenario["persona"].replace("You are", "I am").replace("You ", "I ")
+    name = scenario.get("patient_name", "Anna Jensen")
+    return [
+        opening,
+        "Yes, I have a referral from my doctor.",
+        f"{name}, CPR {scenario.get('cpr', '150785-1234')}, mobile {scenario.get('phone', '55512345')}.",
+    ]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def login(base_url: str, username: str, password: str) -> str:
+    """The Cookie header value of a logged-in staff session."""
+    opener = urllib.request.build_opener(_NoRedirect)
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    try:
+        opener.open(f"{base_url}/login", data=body)
+        raise RuntimeError("login did not redirect")
+    except urllib.error.HTTPError as e:  # the 303 to "/" carries the cookie
+        if e.code != 303:
+            raise RuntimeError(f"login failed: HTTP {e.code}") from None
+        cookie = e.headers.get("set-cookie", "")
+    return cookie.split(";", 1)[0]
+
+
+def db_stats(base_url: str, cookie: str) -> dict:
+    request = urllib.request.Request(f"{base_url}/api/stats/db", headers={"Cookie": cookie})
+    with urllib.request.urlopen(request) as resp:
+        return json.loads(resp.read())
+
+
+async def _reply(ws, timeout: float) -> dict:
+    """Read frames until the turn's reply ("chat" or "complete")."""
+    while True:
+        frame = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+        if frame.get("type") in REPLY_TYPES:
+            return frame
+
+
+async def run_patient(ws_url: str, cookie: str, script: list[str], timeout: float) -> dict:
+    """One simulated patient: connect, send the script turn by turn, time each reply."""
+    result = {"connect": None, "sent": 0, "latencies": [], "errors": [], "completed": False}
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(ws_url, additional_headers={"Cookie": cookie},
+                                      open_timeout=timeout) as ws:
+            result["connect"] = time.perf_counter() - started
+            for message in script:
+                sent = time.perf_counter()
+                await ws.send(json.dumps({"type": "chat", "data": {"message": message}}))
+                result["sent"] += 1
+                frame = await _reply(ws, timeout)
+                result["latencies"].append(time.perf_counter() - sent)
+                if frame["type"] == "chat" and frame["data"]["message"].startswith(ERROR_PREFIX):
+                    result["errors"].append(frame["data"]["message"][:120])
+                if frame["type"] == "complete":
+                    result["completed"] = True
+                    break
+    except Exception as e:  # noqa: BLE001
+        result["errors"].append(f"{type(e).__name__}: {e}"[:120])
+    return result
+
+
+def _stats_delta(before: dict, after: dict) -> dict:
+    """after - before for every numeric counter (maxima are reported as of after)."""
+    delta = {}
+    for key, value in after.items():
+        if isinstance(value, dict):
+            delta[key] = _stats_delta(before.get(key, {}), value)
+        elif isinstance(value, (int, float)) and not (key == "max" or key.endswith("_max")):
+            delta[key] = value - before.get(key, 0)
+        else:
+            delta[key] = value
+    return delta
+
+
+def _ms(value: float | None) -> str:
+    return f"{value * 1000:8.1f}ms" if value is not None else "        -"
+
+
+def _report(results: list[dict], wall_clock: float, before: dict | None, after: dict | None):
+    connects = [r["connect"] for r in results if r["connect"] is not None]
+    latencies = [lat for r in results for lat in r["latencies"]]
+    errored = [r for r in results if r["errors"]]
+    sent = sum(r["sent"] for r in results)
+    errors = sum(len(r["errors"]) for r in results)
+
+    print(f"\n{'':24s} {'p50':>10s} {'p95':>10s} {'p99':>10s} {'max':>10s}")
+    for label, values in (("Connection setup", connects), ("Message reply", latencies)):
+        print(f"  {label:22s} {_ms(percentile(values, 50))} {_ms(percentile(values, 95))} "
+              f"{_ms(percentile(values, 99))} {_ms(max(values) if values else None)}")
+
+    print(f"\n  Patients:   {len(results)} ({len(connects)} connected, "
+          f"{sum(r['completed'] for r in results)} completed triage)")
+    print(f"  Messages:   {len(latencies)} answered in {wall_clock:.1f}s "
+          f"({len(latencies) / max(wall_clock, 1e-9):.1f} msg/s)")
+    print(f"  Errors:     {errors} ({errors / max(sent, 1):.1%} of {sent} messages sent), "
+          f"{len(errored)}/{len(results)} patients affected")
+    seen = {}
+    for r in errored:
+        for err in r["errors"]:
+            seen[err] = seen.get(err, 0) + 1
+    for err, count in sorted(seen.items(), key=lambda kv: -kv[1])[:5]:
+        print(f"    {count:4d}x {err}")
+
+    if before is None or after is None:
+        return
+    delta = _stats_delta(before, after)
+    print(f"\n  Dashboard DB (worker {after['worker']}):")
+    for kind in ("read", "write"):
+        s = delta[kind]
+        calls = max(s["calls"], 1)
+        print(f"    {kind:5s} {s['calls']:6d} calls  queued avg {_ms(s['queue_seconds'] / calls)} "
+              f"max {_ms(s['queue_max'])}  running avg {_ms(s['run_seconds'] / calls)} "
+              f"max {_ms(s['run_max'])}")
+    lock = delta["write_lock"]
+    print(f"    write lock (explicit transactions): {lock['transactions']} begun, {lock['contended']} waited "
+          f"(total {lock['lock_wait_seconds']:.3f}s, max {_ms(lock['lock_wait_max']).strip()}), "
+          f"{lock['busy_errors']} busy timeouts")
+    print(f"\n  SDK session DB (TriageSession, lock waits included):")
+    for kind in ("read", "write"):
+        s = delta["sdk_sessions"][kind]
+        print(f"    {kind:5s} {s['calls']:6d} calls  avg {_ms(s['seconds'] / max(s['calls'], 1))} "
+              f"max {_ms(s['max'])}")
+
+
+def spawn_server(port: int, workers: int, latency: str, data_dir: str) -> subprocess.Popen:
+    """Start main.py on the stub model with its databases in data_dir."""
+    env = {**os.environ, "MODEL_PROVIDER": "stub", "STUB_MODEL_LATENCY_MS": latency,
+           "TRIAGE_DATA_DIR": data_dir}
+    return subprocess.Popen(
+        [sys.executable, "main.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_healthy(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health"):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"server at {base_url} did not come up") from None
+            time.sleep(0.2)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="WebSocket load test with simulated patients")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--clients", type=int, default=20, help="Simulated patients, all connected at once")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which to stagger connections")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for a connection or reply")
+    parser.add_argument("--scenario", type=str, help="Script every patient with this scenario (default: cycle all)")
+    parser.add_argument("--username", default=os.getenv("DEMO_USER", "admin"))
+    parser.add_argument("--password", default=os.getenv("DEMO_PASS", "kvinde2026"))
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a stub-model server on a temporary data directory for the run")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --spawn")
+    parser.add_argument("--latency", default="200-800", help="STUB_MODEL_LATENCY_MS for --spawn")
+    args = parser.parse_args()
+
+    if args.scenario:
+        scenarios = [s for s in SCENARIOS if s["name"] == args.scenario]
+        if not scenarios:
+            print(f"Unknown scenario: {args.scenario}")
+            return 1
+    else:
+        scenarios = SCENARIOS
+
+    server = None
+    base_url = args.url.rstrip("/")
+    if args.spawn:
+        base_url = f"http://127.0.0.1:{args.port}"
+        data_dir = tempfile.mkdtemp(prefix="triage-load-")
+        server = spawn_server(args.port, args.workers, args.latency, data_dir)
+        print(f"Started stub-model server on {base_url} (data in {data_dir})")
+    try:
+        wait_until_healthy(base_url)
+        cookie = login(base_url, args.username, args.password)
+        ws_base = "ws" + base_url[len("http"):]
+        run_id = uuid.uuid4().hex[:6]
+        before = db_stats(base_url, cookie)
+
+        async def patient(i: int) -> dict:
+            if args.ramp > 0:
+                await asyncio.sleep(args.ramp * i / args.clients)
+            script = scenario_script(scenarios[i % len(scenarios)])
+            return await run_patient(f"{ws_base}/ws/load_{run_id}_{i}", cookie, script, args.timeout)
+
+        print(f"Running {args.clients} patients against {ws_base}/ws/ ...", flush=True)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(patient(i) for i in range(args.clients)))
+        wall_clock = time.perf_counter() - started
+        after = db_stats(base_url, cookie)
+        _report(results, wall_clock, before, after)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    return 0 if not any(r["errors"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -6,22 +6,52 @@ Usage:
     python -m tests.war_games.run_war_games                          # run all scenarios
     python -m tests.war_games.run_war_games --scenario heavy_bleeding # run one scenario
     python -m tests.war_games.run_war_games --list                    # list available scenarios
+    python -m tests.war_games.run_war_games --record                  # run live, save cassettes
+    python -m tests.war_games.run_war_games --replay                  # offline, from saved cassettes
+    python -m tests.war_games.run_war_games --concurrency 8           # up to 8 scenarios at once
 """
 
 import sys
+import time
 import asyncio
 import argparse
 
 from openai import AsyncOpenAI
+from agents import set_default_openai_client, set_tracing_disabled
 
 from tests.war_games.scenarios import SCENARIOS
-from tests.war_games.runner import run_scenario
+from tests.war_games.runner import run_scenario, turn_metrics, RATE_LIMIT_RETRIES
+from tests.war_games import cassette
+
+
+def _metrics_line(name: str, m: dict) -> str:
+    def secs(v):
+        return f"{v:5.2f}s" if v is not None else "     -"
+    cache = f"{m['cache_hit_rate']:6.0%}" if m["cache_hit_rate"] is not None else "     -"
+    return (f"               {name:30s} {secs(m['p50'])} {secs(m['p95'])} {m['tool_calls']:5d} "
+            f"{m['input_tokens']:8,d} {m['output_tokens']:7,d} {cache}")
+
+
+def _non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {number}")
+    return number
 
 
 async def main():
     parser = argparse.ArgumentParser(description="Live AI-vs-AI war game testing")
     parser.add_argument("--scenario", type=str, help="Run a specific scenario by name")
     parser.add_argument("--list", action="store_true", help="List all available scenarios")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", action="store_const", const="record", dest="cassette",
+                      help="Run live and save every model exchange as a cassette")
+    mode.add_argument("--replay", action="store_const", const="replay", dest="cassette",
+                      help="Serve model exchanges from saved cassettes (no network); reports prompt drift")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Scenarios to run at once (each has its own session); default 1")
+    parser.add_argument("--retries", type=_non_negative_int, default=RATE_LIMIT_RETRIES,
+                        help="Times to restart a rate-limited scenario, with exponential backoff")
     args = parser.parse_args()
 
     if args.list:
@@ -30,7 +60,16 @@ async def main():
             print(f"  {s['name']:30s}  [{esc}]  {s['persona'][:60]}...")
         return 0
 
-    client = AsyncOpenAI()
+    if args.cassette:
+        cassette.install()
+    if args.cassette == "replay":
+        set_tracing_disabled(True)  # offline: nothing to export
+    client = None
+    if args.cassette != "replay":
+        # One client for the patient simulator and the agents, so both share its
+        # connection pool and its retry-with-backoff on 429s
+        client = AsyncOpenAI(max_retries=5)
+        set_default_openai_client(client)
 
     if args.scenario:
         scenarios = [s for s in SCENARIOS if s["name"] == args.scenario]
@@ -41,16 +80,29 @@ async def main():
     else:
         scenarios = SCENARIOS
 
-    # Run scenarios sequentially (each is an independent AI conversation)
-    results = []
-    for scenario in scenarios:
-        print(f"  Running {scenario['name']}...", end=" ", flush=True)
-        result = await run_scenario(client, scenario)
+    # Each scenario is an independent conversation with its own session, so up to
+    # --concurrency of them run at once; results stay in scenario order
+    semaphore = asyncio.Semaphore(max(args.concurrency, 1))
+    sequential = args.concurrency <= 1
+
+    async def run_one(scenario: dict) -> dict:
+        async with semaphore:
+            if sequential:
+                print(f"  Running {scenario['name']}...", end=" ", flush=True)
+            result = await run_scenario(client, scenario, args.cassette, args.retries)
         status = result["status"]
         turns = result.get("turns", 0)
         detail = f" — {result.get('reason', '')}" if status != "PASS" else ""
-        print(f"{status} ({turns} turns){detail}", flush=True)
-        results.append(result)
+        drift = f" [DRIFT in {len(result['drift'])} calls]" if result.get("drift") else ""
+        retried = f" [{result['attempts']} attempts]" if result.get("attempts", 1) > 1 else ""
+        line = f"{status} ({turns} turns, {result['elapsed']:.1f}s){detail}{drift}{retried}"
+        print(line if sequential else f"  {scenario['name']}: {line}", flush=True)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_one(s) for s in scenarios))
+    wall_clock = time.perf_counter() - started
+    summed = sum(r["elapsed"] for r in results)
 
     # Summary
     passed = sum(1 for r in results if r["status"] == "PASS")
@@ -58,8 +110,27 @@ async def main():
     total = len(results)
     avg_turns = sum(r.get("turns", 0) for r in results if r["status"] == "PASS") / max(passed, 1)
 
+    if not sequential:
+        print(f"\nScenarios:")
+        for r in results:
+            print(f"  {r['status']:5s} {r['name']:30s} {r.get('turns', 0):2d} turns  {r['elapsed']:6.1f}s")
+
+    # Per-turn latency and token accounting (triage agent runs only)
+    print(f"\nTriage turns:  {'scenario':30s} {'p50':>6s} {'p95':>6s} {'tools':>5s} "
+          f"{'in tok':>8s} {'out tok':>7s} {'cached':>6s}")
+    for r in results:
+        print(_metrics_line(r["name"], r["metrics"]))
+    overall = turn_metrics([c for r in results for c in r.get("conversation", [])])
+    print(_metrics_line("ALL", overall))
+    completed = [r["metrics"] for r in results if r["metrics"]["completed"]]
+    if completed:
+        per_triage = sum(m["input_tokens"] + m["output_tokens"] for m in completed) / len(completed)
+        print(f"  Tokens per completed triage: {per_triage:,.0f} (over {len(completed)} triages)")
+
     print(f"\n{'='*60}")
     print(f"RESULTS: {passed}/{total} passed | Avg turns (passing): {avg_turns:.1f}")
+    print(f"TIME: {wall_clock:.1f}s wall clock | {summed:.1f}s summed scenario time "
+          f"({summed / max(wall_clock, 1e-9):.1f}x, concurrency {max(args.concurrency, 1)})")
     print(f"{'='*60}")
 
     if failed:
@@ -72,6 +143,13 @@ async def main():
                     for msg in r["conversation"][-6:]:  # last 6 messages
                         print(f"      [{msg['role']}] {msg['text'][:100]}")
 
+    drifted = [r for r in results if r.get("drift")]
+    if drifted:
+        print(f"\nPrompt drift (replayed responses may no longer match what the model would say):")
+        for r in drifted:
+            calls = ", ".join(f"{d['kind']}#{d['call']} ({'/'.join(d['changed'])})" for d in r["drift"])
+            print(f"  {r['name']}: {calls}")
+
     return 0 if failed == 0 else 1
 
 
@@ -1,15 +1,27 @@
 """War game runner — AI-vs-AI conversation simulator."""
 
+import asyncio
+import math
 import os
+import random
+import time
 import uuid
 
-from openai import AsyncOpenAI
-from agents import Runner, SQLiteSession
+from openai import AsyncOpenAI, RateLimitError
+from agents import Runner
+from agents.items import ToolCallItem
 
 from triage.config import MODEL, DB_DIR
 from triage.models import BookingRequest, HandoffRequest
 from triage.agents import triage_agent
+from triage.history import TriageSession
 from triage.orchestrator import parse_triage_data, enrich_booking, run_handoff
+from tests.war_games.cassette import Cassette, chat
+
+# Scenario restarts on provider rate limits (after the client's own retries), and the
+# base of their exponential backoff in seconds
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF = 5.0
 
 
 # =============================================================================
@@ -38,6 +50,55 @@ CPR number: {cpr}
 """
 
 
+# =============================================================================
+# Turn metrics
+# =============================================================================
+
+def _turn_stats(result, latency: float) -> dict:
+    """Timing and usage of one triage-agent run, for its conversation_log entry."""
+    usage = result.context_wrapper.usage
+    return {
+        "latency": latency,
+        "model_calls": usage.requests,
+        "tool_calls": sum(1 for item in result.new_items if isinstance(item, ToolCallItem)),
+        "input_tokens": usage.input_tokens,
+        "cached_tokens": usage.input_tokens_details.cached_tokens,
+        "output_tokens": usage.output_tokens,
+    }
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def turn_metrics(conversation: list[dict]) -> dict:
+    """Latency percentiles, token totals and prompt-cache hit rate over the triage turns."""
+    turns = [c for c in conversation if c["role"] == "triage" and "latency" in c]
+    latencies = [t["latency"] for t in turns]
+    input_tokens = sum(t["input_tokens"] for t in turns)
+    cached_tokens = sum(t["cached_tokens"] for t in turns)
+    return {
+        "turns": len(turns),
+        "completed": any(t["text"] == "[TRIAGE COMPLETE]" for t in turns),
+        "latencies": latencies,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "tool_calls": sum(t["tool_calls"] for t in turns),
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "output_tokens": sum(t["output_tokens"] for t in turns),
+        "cache_hit_rate": cached_tokens / input_tokens if input_tokens else None,
+    }
+
+
+# =============================================================================
+# Conversation
+# =============================================================================
+
 async def simulate_patient(
     client: AsyncOpenAI,
     scenario: dict,
@@ -46,7 +107,7 @@ async def simulate_patient(
     """Run a full AI-vs-AI conversation and return results."""
     session_id = f"wg_{scenario['name']}_{uuid.uuid4().hex[:6]}"
     db_path = str(DB_DIR / "war_games_live.db")
-    session = SQLiteSession(session_id, db_path)
+    session = TriageSession(session_id, db_path)
 
     # Build patient simulator prompt
     lang_inst = ""
@@ -74,49 +135,51 @@ async def simulate_patient(
     if opening:
         patient_msg = opening
     else:
-        resp = await client.chat.completions.create(
+        patient_msg = (await chat(
+            client,
             model=MODEL,
             messages=patient_history + [
                 {"role": "user", "content": "You are now contacting the clinic. Send your first message."}
             ],
             max_completion_tokens=150,
-        )
-        patient_msg = resp.choices[0].message.content.strip()
+        )).strip()
 
     for turn in range(1, max_turns + 1):
         conversation_log.append({"turn": turn, "role": "patient", "text": patient_msg})
 
         # Send to triage agent
+        started = time.perf_counter()
         result = await Runner.run(triage_agent, patient_msg, session=session, max_turns=5)
+        stats = _turn_stats(result, time.perf_counter() - started)
 
         # Check for triage completion
         if isinstance(result.final_output, str):
             try:
                 triage_data = parse_triage_data(result.final_output)
-                conversation_log.append({"turn": turn, "role": "triage", "text": "[TRIAGE COMPLETE]"})
+                conversation_log.append({"turn": turn, "role": "triage", "text": "[TRIAGE COMPLETE]", **stats})
                 break
             except Exception:
                 agent_response = result.final_output.strip()
         else:
             try:
                 triage_data = parse_triage_data(result.final_output)
-                conversation_log.append({"turn": turn, "role": "triage", "text": "[TRIAGE COMPLETE]"})
+                conversation_log.append({"turn": turn, "role": "triage", "text": "[TRIAGE COMPLETE]", **stats})
                 break
             except Exception:
                 agent_response = str(result.final_output)
 
-        conversation_log.append({"turn": turn, "role": "triage", "text": agent_response})
+        conversation_log.append({"turn": turn, "role": "triage", "text": agent_response, **stats})
 
         # Generate patient response
         patient_history.append({"role": "assistant", "content": patient_msg})
         patient_history.append({"role": "user", "content": f"The clinic assistant says: \"{agent_response}\"\n\nRespond as the patient."})
 
-        resp = await client.chat.completions.create(
+        patient_msg = (await chat(
+            client,
             model=MODEL,
             messages=patient_history,
             max_completion_tokens=150,
-        )
-        patient_msg = resp.choices[0].message.content.strip()
+        )).strip()
 
     # Build result
     total_turns = len([c for c in conversation_log if c["role"] == "patient"])
@@ -156,7 +219,7 @@ async def simulate_patient(
 
     # Build output for verification
     if is_escalation:
-        handoff = await run_handoff(triage_data, session)
+        handoff = await run_handoff(triage_data, session.internal_view())
         output = {
             "condition_id": triage_data.condition_id,
             "category": triage_data.category,
@@ -208,15 +271,52 @@ async def simulate_patient(
     }
 
 
-async def run_scenario(client: AsyncOpenAI, scenario: dict) -> dict:
-    """Run a single scenario with error handling."""
-    try:
+async def _attempt(client: AsyncOpenAI | None, scenario: dict, cassette_mode: str | None) -> dict:
+    if cassette_mode is None:
         return await simulate_patient(client, scenario)
-    except Exception as e:
-        return {
+    cassette = Cassette(scenario["name"], cassette_mode)
+    with cassette.active():
+        result = await simulate_patient(client, scenario)
+    if cassette_mode == "record":
+        cassette.save()
+    result["drift"] = cassette.drift
+    return result
+
+
+async def run_scenario(
+    client: AsyncOpenAI | None,
+    scenario: dict,
+    cassette_mode: str | None = None,
+    retries: int = RATE_LIMIT_RETRIES,
+) -> dict:
+    """Run a single scenario with error handling.
+    cassette_mode "record" or "replay" runs it against tests/war_games/cassettes (see cassette.py).
+    A provider rate-limit error restarts the scenario after an exponential backoff,
+    up to `retries` times. The result carries the scenario's "elapsed" seconds.
+    Raises ValueError for negative retries."""
+    if retries < 0:
+        raise ValueError(f"retries must be 0 or more, got {retries}")
+    started = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            result = await _attempt(client, scenario, cassette_mode)
+            break
+        except RateLimitError as e:
+            if attempt < retries:
+                await asyncio.sleep(RATE_LIMIT_BACKOFF * 2 ** attempt * random.uniform(1, 1.5))
+                continue
+            error = f"rate limited after {retries + 1} attempts: {e}"
+        except Exception as e:
+            error = str(e)
+        result = {
             "name": scenario["name"],
             "status": "ERROR",
-            "reason": str(e),
+            "reason": error,
             "turns": 0,
             "conversation": [],
         }
+        break
+    result["elapsed"] = time.perf_counter() - started
+    result["attempts"] = attempt + 1
+    result["metrics"] = turn_metrics(result.get("conversation", []))
+    return result
@@ -4,8 +4,9 @@ from datetime import date
 
 from agents import Agent, ModelSettings
 
-from triage.config import MODEL, get_condition_reference
+from triage.config import config_version, get_condition_reference
 from triage.models import TriageData, HandoffRequest
+from triage.stub_model import model_for
 from triage.tools import fetch_condition_details, complete_triage, validate_complete_triage
 
 
@@ -13,11 +14,7 @@ from triage.tools import fetch_condition_details, complete_triage, validate_comp
 # Triage Instructions
 # =============================================================================
 
-_TODAY = date.today()
-_TODAY_ISO = _TODAY.strftime("%Y-%m-%d")
-_TODAY_READABLE = _TODAY.strftime("%A, %B %d, %Y")
-
-TRIAGE_INSTRUCTIONS = f"""You are the AI triage assistant for Gynækologerne Skensved og Bune, a Danish gynecology clinic.
+TRIAGE_INSTRUCTIONS = """You are the AI triage assistant for Gynækologerne Skensved og Bune, a Danish gynecology clinic.
 You handle the ENTIRE patient conversation — from greeting to final data collection.
 
 === LANGUAGE — CRITICAL, CHECK EVERY MESSAGE ===
@@ -174,26 +171,41 @@ IMPORTANT: "I want to talk to the doctor" or "I want to see the doctor" is NOT a
 _TRIAGE_INSTRUCTIONS_TEMPLATE = TRIAGE_INSTRUCTIONS
 
 
-def _build_triage_instructions(context=None, agent=None) -> str:
-    """Build triage instructions dynamically so condition edits take effect without restart."""
-    today = date.today()
-    today_iso = today.strftime("%Y-%m-%d")
-    today_readable = today.strftime("%A, %B %d, %Y")
+def _date_suffix(today: date) -> str:
     return (
-        _TRIAGE_INSTRUCTIONS_TEMPLATE
-        + get_condition_reference()
-        + f"\n\n=== TODAY'S DATE ===\nToday is {today_readable} ({today_iso}).\n"
+        f"\n\n=== TODAY'S DATE ===\nToday is {today.strftime('%A, %B %d, %Y')} ({today.isoformat()}).\n"
         "Use this to convert relative dates from patients (e.g. \"about a week ago\", \"last Monday\") to YYYY-MM-DD format.\n"
     )
 
 
+# ((config version, date), instructions) for the last build
+_instructions_cache: tuple[tuple[int, date], str] | None = None
+
+
+def _build_triage_instructions(context=None, agent=None) -> str:
+    """Triage instructions: the static template and condition reference, then today's date.
+
+    Built once per (config version, date) so condition edits take effect without a
+    restart. Everything before the date suffix is byte-identical between builds with
+    the same conditions, which is the prefix prompt_cache_retention caches.
+    """
+    global _instructions_cache
+    key = (config_version(), date.today())
+    cached = _instructions_cache
+    if cached is None or cached[0] != key:
+        cached = _instructions_cache = (
+            key, _TRIAGE_INSTRUCTIONS_TEMPLATE + get_condition_reference() + _date_suffix(key[1]),
+        )
+    return cached[1]
+
+
 # =============================================================================
 # Agent Definitions
 # =============================================================================
 
 triage_agent = Agent(
     name="Triage",
-    model=MODEL,
+    model=model_for("triage"),
     instructions=_build_triage_instructions,
     tools=[fetch_condition_details, complete_triage],
     tool_use_behavior=validate_complete_triage,
@@ -203,7 +215,7 @@ triage_agent = Agent(
 
 handoff_agent = Agent(
     name="Staff Handoff",
-    model=MODEL,
+    model=model_for("handoff"),
     instructions="""You are summarizing a patient conversation for clinic staff at Gynækologerne Skensved og Bune.
 
 Read the FULL conversation and the triage data provided. Produce a HandoffRequest with:
@@ -220,7 +232,7 @@ Be thorough — the staff member has NOT read the chat.""",
 
 confirmation_agent = Agent(
     name="Confirmation",
-    model=MODEL,
+    model=model_for("confirmation"),
     instructions="""You are sending a confirmation message to a patient at Gynækologerne Skensved og Bune.
 You have just finished collecting their information for a gynecology appointment.
 
@@ -1,30 +1,94 @@
 """FastAPI application: REST routes, WebSocket, and static file serving."""
 
-import json
+import asyncio
+import logging
+import os
 import uuid
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from triage.config import PROJECT_DIR, DB_DIR, get_conditions, reload_conditions, update_condition, add_condition
+from triage.conditions import ConditionError
 from triage.auth import login_required, handle_login, handle_logout, get_current_user
-from triage.session_store import SessionStore
-from triage.orchestrator import run_agent_turn
+from triage.session_store import SessionStore, AsyncSessionStore, URGENCY_RANK
+from triage.events import inbox_events
+from triage.history import migrate_sdk_history, session_io_stats
+from triage.orchestrator import run_agent_turn, record_reply, BOOKING_FALLBACK_CONFIRMATION
 from triage.notifications import get_sms_sender, build_confirmation_message, build_confirmation_url
 
 
+logger = logging.getLogger("triage.api")
+
+TOKEN_PURGE_INTERVAL_SECONDS = 3600
+INBOX_RELAY_INTERVAL_SECONDS = 1.0
+# Identifies this server worker in the shared inbox change feed
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
 # =============================================================================
 # App Setup
 # =============================================================================
 
-app = FastAPI(title="Gynækologerne Skensved og Bune Triage", docs_url=None, redoc_url=None)
+async def _purge_tokens_periodically():
+    """Background job: drop stale confirmation tokens so the token index stays small."""
+    while True:
+        try:
+            purged = await store.purge_stale_tokens()
+            if purged:
+                logger.info("Purged %d stale confirmation tokens", purged)
+            await store.prune_inbox_changes()
+        except Exception:  # noqa: BLE001
+            logger.exception("Confirmation token purge failed")
+        await asyncio.sleep(TOKEN_PURGE_INTERVAL_SECONDS)
+
+
+async def _relay_inbox_changes():
+    """Background job: push inbox rows changed by other server workers to this
+    worker's live subscribers (each worker only publishes its own changes locally)."""
+    last_id = None
+    while True:
+        try:
+            last_id, changed = await store.inbox_changes_since(last_id, WORKER_ID)
+            for session_id in changed:
+                row = await store.get_inbox_row(session_id)
+                if row is not None:
+                    inbox_events.publish("row", row)
+        except Exception:  # noqa: BLE001
+            logger.exception("Inbox change relay failed")
+        await asyncio.sleep(INBOX_RELAY_INTERVAL_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrate_sdk_history(DB_DIR / "triage_sessions.db")
+    tasks = [
+        asyncio.create_task(_purge_tokens_periodically()),
+        asyncio.create_task(_relay_inbox_changes()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(title="Gynækologerne Skensved og Bune Triage", docs_url=None, redoc_url=None, lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=str(PROJECT_DIR / "static")), name="static")
 templates = Jinja2Templates(directory=str(PROJECT_DIR / "templates"))
 
-store = SessionStore(DB_DIR / "dashboard.db")
+store = AsyncSessionStore(SessionStore(DB_DIR / "dashboard.db"))
+
+
+async def publish_inbox_row(session_id: str):
+    """Push the session's current inbox row to live inbox subscribers, here and
+    (through the change feed) on every other server worker."""
+    row = await store.get_inbox_row(session_id)
+    if row is not None:
+        inbox_events.publish("row", row)
+    await store.log_inbox_change(session_id, WORKER_ID)
 
 
 # =============================================================================
@@ -81,7 +145,7 @@ async def index(request: Request):
 @app.get("/history", response_class=HTMLResponse)
 async def history_page(request: Request):
     user = get_current_user(request)
-    sessions = store.list_sessions()
+    sessions = await store.list_sessions()
     return templates.TemplateResponse("history.html", {
         "request": request,
         "user": user,
@@ -110,27 +174,40 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/api/stats/db")
+async def api_db_stats():
+    """Database contention counters for the worker answering (load testing): the
+    dashboard store's, and the SDK session database's as seen by TriageSession."""
+    return {"worker": WORKER_ID, **store.stats(), "sdk_sessions": session_io_stats()}
+
+
 @app.get("/api/sessions")
 async def api_list_sessions():
-    return store.list_sessions()
+    return await store.list_sessions()
 
 
 @app.get("/api/sessions/{session_id}")
 async def api_get_session(session_id: str):
-    session = store.get_session(session_id)
+    session = await store.get_session(session_id)
     if not session:
         from fastapi.responses import JSONResponse
         return JSONResponse({"error": "not found"}, status_code=404)
-    result = store.get_result(session_id)
+    result = await store.get_result(session_id)
     session["result"] = result
-    session["conversation"] = store.get_conversation(session_id)
+    session["conversation"] = await store.get_conversation(session_id)
     return session
 
 
+@app.get("/api/sessions/{session_id}/conversation")
+async def api_get_conversation(session_id: str, after: int = 0):
+    """Transcript messages with id > after, so an open detail view can tail a live chat."""
+    return {"messages": await store.get_conversation(session_id, after)}
+
+
 @app.post("/api/sessions")
 async def api_create_session():
     session_id = f"demo_{uuid.uuid4().hex[:8]}"
-    meta = store.create_session(session_id)
+    meta = await store.create_session(session_id)
     return {"session_id": meta.session_id, "created_at": meta.created_at.isoformat()}
 
 
@@ -158,7 +235,11 @@ async def api_update_condition(condition_id: int, request: Request):
         return JSONResponse({"error": "not found"}, status_code=404)
     data = await request.json()
     data.pop("id", None)
-    update_condition(condition_id, data)
+    try:
+        update_condition(condition_id, data)
+    except ConditionError as e:
+        from fastapi.responses import JSONResponse
+        return JSONResponse({"error": str(e)}, status_code=400)
     return get_conditions()[condition_id]
 
 
@@ -168,38 +249,46 @@ async def api_create_condition(request: Request):
     if "id" not in data:
         conditions = get_conditions()
         data["id"] = max(conditions.keys()) + 1 if conditions else 1
-    add_condition(data)
+    try:
+        add_condition(data)
+    except ConditionError as e:
+        from fastapi.responses import JSONResponse
+        return JSONResponse({"error": str(e)}, status_code=400)
     return get_conditions()[data["id"]]
 
 
 @app.post("/api/conditions/reload")
 async def api_reload_conditions():
-    reload_conditions()
+    try:
+        reload_conditions()
+    except ConditionError as e:
+        from fastapi.responses import JSONResponse
+        return JSONResponse({"error": str(e)}, status_code=400)
     return {"status": "ok", "count": len(get_conditions())}
 
 
 @app.delete("/api/sessions/inactive")
 async def api_delete_inactive():
-    count = store.delete_inactive()
+    count = await store.delete_inactive()
     return {"deleted": count}
 
 
 @app.get("/api/sessions/{session_id}/comments")
 async def api_list_comments(session_id: str):
-    return store.list_comments(session_id)
+    return await store.list_comments(session_id)
 
 
 @app.post("/api/sessions/{session_id}/comments")
 async def api_add_comment(session_id: str, request: Request):
     from fastapi.responses import JSONResponse
-    if not store.get_session(session_id):
+    if not await store.get_session(session_id):
         return JSONResponse({"error": "not found"}, status_code=404)
     data = await request.json()
     author = (data.get("author") or "").strip()
     body = (data.get("body") or "").strip()
     if not author or not body:
         return JSONResponse({"error": "author and body required"}, status_code=400)
-    return store.add_comment(session_id, author, body)
+    return await store.add_comment(session_id, author, body)
 
 
 @app.put("/api/comments/{comment_id}")
@@ -209,7 +298,7 @@ async def api_update_comment(comment_id: int, request: Request):
     body = (data.get("body") or "").strip()
     if not body:
         return JSONResponse({"error": "body required"}, status_code=400)
-    updated = store.update_comment(comment_id, body)
+    updated = await store.update_comment(comment_id, body)
     if updated is None:
         return JSONResponse({"error": "not found"}, status_code=404)
     return updated
@@ -218,7 +307,7 @@ async def api_update_comment(comment_id: int, request: Request):
 @app.delete("/api/comments/{comment_id}")
 async def api_delete_comment(comment_id: int):
     from fastapi.responses import JSONResponse
-    if not store.delete_comment(comment_id):
+    if not await store.delete_comment(comment_id):
         return JSONResponse({"error": "not found"}, status_code=404)
     return {"deleted": True}
 
@@ -226,9 +315,53 @@ async def api_delete_comment(comment_id: int):
 ALLOWED_PROCESSING = {"new", "in_progress", "done", "followup"}
 
 
+ALLOWED_CONFIRMATION = {"none", "pending", "expired", "confirmed", "cancelled"}
+INBOX_PAGE_MAX = 500
+
+
 @app.get("/api/inbox")
-async def api_inbox():
-    return store.list_inbox()
+async def api_inbox(
+    limit: int = 100,
+    cursor: str | None = None,
+    processing_status: str | None = None,
+    doctor: str | None = None,
+    confirmation: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    closed: bool | None = None,
+):
+    """Keyset-paginated inbox. processing_status accepts a comma-separated list;
+    closed=false leaves out done and cancelled rows (the active board)."""
+    from fastapi.responses import JSONResponse
+    statuses = [p for p in (processing_status or "").split(",") if p] or None
+    if statuses and not set(statuses) <= ALLOWED_PROCESSING:
+        return JSONResponse({"error": "invalid processing_status"}, status_code=400)
+    if confirmation is not None and confirmation not in ALLOWED_CONFIRMATION:
+        return JSONResponse({"error": "invalid confirmation"}, status_code=400)
+    try:
+        return await store.page_inbox(
+            limit=max(1, min(limit, INBOX_PAGE_MAX)),
+            cursor=cursor,
+            processing_status=statuses,
+            doctor=doctor,
+            confirmation=confirmation,
+            since=since,
+            until=until,
+            closed=closed,
+        )
+    except ValueError:
+        return JSONResponse({"error": "invalid cursor"}, status_code=400)
+
+
+@app.get("/api/inbox/stream")
+async def api_inbox_stream():
+    """Server-Sent Events: a "row" event with the full inbox row whenever a session
+    completes, changes processing status, or its confirmation state changes."""
+    return StreamingResponse(
+        inbox_events.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.patch("/api/sessions/{session_id}/processing")
@@ -239,9 +372,10 @@ async def api_set_processing(session_id: str, request: Request):
     if status not in ALLOWED_PROCESSING:
         return JSONResponse({"error": "invalid processing_status"}, status_code=400)
     processed_by = (data.get("processed_by") or "").strip() or None
-    updated = store.set_processing(session_id, status, processed_by)
+    updated = await store.set_processing(session_id, status, processed_by)
     if updated is None:
         return JSONResponse({"error": "not found"}, status_code=404)
+    await publish_inbox_row(session_id)
     return updated
 
 
@@ -252,22 +386,24 @@ async def api_set_processing(session_id: str, request: Request):
 @app.post("/api/sessions/{session_id}/book")
 async def api_book(session_id: str):
     from fastapi.responses import JSONResponse
-    res = store.mark_booked(session_id)
+    res = await store.mark_booked(session_id)
     if not res.get("ok"):
         return JSONResponse({"error": res.get("error", "could not book")}, status_code=400)
-    result = store.get_result(session_id) or {}
+    result = await store.get_result(session_id) or {}
     lang = (result.get("triage") or {}).get("language") or "da"
     body = build_confirmation_message(res["token"], lang)
     get_sms_sender().send(res["phone"], body)
+    await publish_inbox_row(session_id)
     return {"ok": True, "confirmation": "pending", "confirm_url": build_confirmation_url(res["token"])}
 
 
 @app.post("/api/sessions/{session_id}/cancel")
 async def api_cancel(session_id: str):
     from fastapi.responses import JSONResponse
-    res = store.cancel_booking(session_id)
+    res = await store.cancel_booking(session_id)
     if not res.get("ok"):
         return JSONResponse({"error": res.get("error", "could not cancel")}, status_code=400)
+    await publish_inbox_row(session_id)
     return {"ok": True, "confirmation": "cancelled"}
 
 
@@ -280,7 +416,9 @@ async def confirm_get(request: Request, token: str):
 
 @app.post("/confirm/{token}", response_class=HTMLResponse)
 async def confirm_post(request: Request, token: str):
-    res = store.confirm_by_token(token)
+    res = await store.confirm_by_token(token)
+    if res["status"] == "confirmed":
+        await publish_inbox_row(res["session_id"])
     return templates.TemplateResponse(
         "confirm.html", {"request": request, "token": token, "state": res["status"]}
     )
@@ -290,13 +428,65 @@ async def confirm_post(request: Request, token: str):
 # WebSocket
 # =============================================================================
 
+async def _await_follow_up(websocket: WebSocket, task: asyncio.Task, fallback: str):
+    """Await a post-completion task while watching the socket. If the patient
+    disconnects first, the task is cancelled and WebSocketDisconnect is raised.
+    If the task fails, fallback is returned instead."""
+    while True:
+        receiver = asyncio.create_task(websocket.receive())
+        done, _ = await asyncio.wait({task, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            receiver.cancel()
+            break
+        message = receiver.result()
+        if message["type"] == "websocket.disconnect":
+            task.cancel()
+            raise WebSocketDisconnect(message.get("code", 1000))
+        # The chat is closed once triage completes; ignore anything else the client sends
+    try:
+        return task.result()
+    except Exception:  # noqa: BLE001
+        logger.exception("Post-completion task failed")
+        return fallback
+
+
+# Detached post-completion jobs; referenced here so they are not garbage-collected
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _run_detached(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _patch_handoff_summary(session_id: str, handoff_task: asyncio.Task, fast_urgency: str):
+    """Patch the handoff agent's summary over the fast-path one once it is ready.
+    A Category A ("immediate") handoff keeps its reason and urgency; for other
+    escalations the agent's urgency replaces the fast path's provisional one. The
+    updated row is pushed to live inbox boards like any other change."""
+    try:
+        handoff = await handoff_task
+    except Exception:  # noqa: BLE001
+        logger.exception("Handoff summary failed for session %s", session_id)
+        return
+    fields = {"conversation_summary": handoff.conversation_summary}
+    if handoff.suggested_action:
+        fields["suggested_action"] = handoff.suggested_action
+    if fast_urgency != "immediate" and handoff.urgency in URGENCY_RANK and handoff.urgency != fast_urgency:
+        fields["urgency"] = handoff.urgency
+        await store.set_urgency(session_id, handoff.urgency)
+    await store.patch_result(session_id, fields)
+    await publish_inbox_row(session_id)
+
+
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await websocket.accept()
 
     # Ensure session exists in store
-    if not store.get_session(session_id):
-        store.create_session(session_id)
+    if not await store.get_session(session_id):
+        await store.create_session(session_id)
 
     try:
         while True:
@@ -313,7 +503,7 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             await websocket.send_json({"type": "status", "data": {"state": "thinking"}})
 
             try:
-                result = await run_agent_turn(session_id, message)
+                result = await run_agent_turn(session_id, message, on_event=websocket.send_json)
             except Exception as e:
                 await websocket.send_json({
                     "type": "chat",
@@ -334,52 +524,70 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                     "type": "chat",
                     "data": {"message": result["content"]},
                 })
+                # Record the condition as soon as a tool call reveals it
+                if result.get("partial", {}).get("condition_name"):
+                    await store.update_session(session_id, condition_name=result["partial"]["condition_name"])
             else:
                 # Triage complete — update session store
                 triage_data = result.get("triage_data", {})
                 result_data = result.get("result", {})
                 is_handoff = result["type"] == "handoff"
 
-                store.update_session(
-                    session_id,
-                    patient_name=triage_data.get("patient_name"),
-                    status="escalated" if is_handoff else "completed",
-                    condition_name=triage_data.get("condition_name"),
-                    result_type=result["type"],
-                )
-                store.save_result(session_id, json.dumps(result_data))
                 if is_handoff:
                     urgency = result_data.get("urgency") or "high"
                 else:
                     category = (triage_data.get("category") or "").upper()
                     urgency = "high" if category == "B" else "normal"
-                store.set_urgency(session_id, urgency)
-
-                # Send triage update with all fields
-                await websocket.send_json({
-                    "type": "triage_update",
-                    "data": triage_data,
-                })
-
-                # Send completion
-                await websocket.send_json({
-                    "type": "complete",
-                    "data": {
-                        "result_type": result["type"],
-                        "result": result_data,
-                        "confirmation": result["content"],
-                    },
-                })
-
-            # Update patient name if available from partial data
-            if result.get("partial", {}).get("condition_name") or result.get("triage_data", {}).get("patient_name"):
-                partial = result.get("partial", {})
-                triage = result.get("triage_data", {})
-                store.update_session(
-                    session_id,
-                    patient_name=triage.get("patient_name") or None,
-                    condition_name=partial.get("condition_name") or triage.get("condition_name") or None,
-                )
+                # The confirmation text or handoff summary still being written; cancelled
+                # on the way out (e.g. the patient left) unless handed to a detached job
+                confirmation_task = result.get("confirmation_task")
+                handoff_task = result.get("handoff_task")
+                pending = [t for t in (confirmation_task, handoff_task) if t is not None]
+                try:
+                    await store.record_completion(
+                        session_id, triage_data, result_data, urgency, result_type=result["type"],
+                    )
+                    await publish_inbox_row(session_id)
+
+                    # Send triage update with all fields
+                    await websocket.send_json({
+                        "type": "triage_update",
+                        "data": triage_data,
+                    })
+
+                    # Send completion
+                    await websocket.send_json({
+                        "type": "complete",
+                        "data": {
+                            "result_type": result["type"],
+                            "result": result_data,
+                            "confirmation": result["content"],
+                            "confirmation_pending": confirmation_task is not None,
+                        },
+                    })
+                    # The staff transcript shows what the patient was told
+                    if result["content"]:
+                        await record_reply(session_id, result["content"])
+
+                    if confirmation_task is not None:
+                        # The confirmation text follows once its agent run finishes
+                        text = await _await_follow_up(
+                            websocket, confirmation_task, BOOKING_FALLBACK_CONFIRMATION,
+                        )
+                        await websocket.send_json({"type": "confirmation", "data": {"message": text}})
+                        await record_reply(session_id, text)
+                    elif handoff_task is not None:
+                        patch = _patch_handoff_summary(session_id, handoff_task, urgency)
+                        if urgency == "immediate":
+                            # Staff need the urgent summary even if the patient has left
+                            pending.remove(handoff_task)
+                            _run_detached(patch)
+                        else:
+                            pending.append(asyncio.create_task(patch))
+                            await _await_follow_up(websocket, pending[-1], None)
+                finally:
+                    for task in pending:
+                        task.cancel()
 
     except WebSocketDisconnect:
         pass
@@ -0,0 +1,268 @@
+"""Compiled condition model — conditions.yaml entries parsed and validated once, at load.
+
+The raw YAML dicts stay the source of truth for the editor and the agent's
+fetch_condition_details output; everything that *interprets* a condition (tools,
+enrich_booking, confirmation text) reads these objects instead, so optional keys,
+cycle rules and lab predicates are decoded once rather than on every call.
+A malformed entry raises ConditionError when the file is loaded or edited.
+"""
+
+import re
+import string
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+CATEGORIES = ("A", "B", "C")
+BEFORE_NEXT_PERIOD = "just_before_next_period"
+_AGE_UNDER = re.compile(r"age_under_(\d+)")
+# confirmation_template lines and the placeholders each may use (see triage.confirmation)
+TEMPLATE_FIELDS = {"reason": (), "lab": ("lab",), "preparation": (), "recovery": ("recovery",)}
+
+
+class ConditionError(ValueError):
+    """A conditions.yaml entry that cannot be compiled."""
+
+
+def _fmt(d: date) -> str:
+    return d.strftime("%b %d")
+
+
+@dataclass(frozen=True, slots=True)
+class CycleWindow:
+    """Where a booking falls in the patient's cycle. Only cycle_dependent and message
+    are always meaningful; the dates are set for whichever case applies."""
+    cycle_dependent: bool
+    message: str
+    no_cycle: bool = False
+    window_passed: bool = False
+    provera_recommended: bool = False
+    valid_start: date | None = None
+    valid_end: date | None = None
+    next_valid_start: date | None = None
+    next_valid_end: date | None = None
+
+    def to_dict(self) -> dict:
+        """The tool-output shape: flags and dates that are set, message last."""
+        out = {"cycle_dependent": self.cycle_dependent}
+        for key in ("no_cycle", "window_passed", "provera_recommended"):
+            if getattr(self, key):
+                out[key] = True
+        for key in ("valid_start", "valid_end", "next_valid_start", "next_valid_end"):
+            if getattr(self, key) is not None:
+                out[key] = getattr(self, key).isoformat()
+        out["message"] = self.message
+        return out
+
+
+class CycleRule:
+    """When in the menstrual cycle a procedure must happen: cycle days start..end,
+    or just before the next period."""
+    __slots__ = ("start_day", "end_day", "before_next_period")
+
+    def __init__(self, start_day: int | None, end_day: int | None, before_next_period: bool = False):
+        self.start_day = start_day
+        self.end_day = end_day
+        self.before_next_period = before_next_period
+
+    @classmethod
+    def parse(cls, value) -> "CycleRule | None":
+        if value is None:
+            return None
+        if value == BEFORE_NEXT_PERIOD:
+            return cls(None, None, before_next_period=True)
+        if (isinstance(value, (list, tuple)) and len(value) == 2
+                and all(isinstance(v, int) and not isinstance(v, bool) for v in value)
+                and 1 <= value[0] <= value[1]):
+            return cls(value[0], value[1])
+        raise ConditionError(f"cycle_days must be [start, end] cycle days or {BEFORE_NEXT_PERIOD!r}, got {value!r}")
+
+    def window(self, last_period: date, cycle_length: int = 28,
+               cycle_range_min: int | None = None, cycle_range_max: int | None = None,
+               today: date | None = None) -> CycleWindow:
+        """The booking window for a period that started on last_period."""
+        if self.before_next_period:
+            next_period = last_period + timedelta(days=cycle_length)
+            window_start = next_period - timedelta(days=3)
+            window_end = next_period - timedelta(days=1)
+            return CycleWindow(
+                cycle_dependent=True,
+                valid_start=window_start,
+                valid_end=window_end,
+                message=f"Best scheduled just before next period: {_fmt(window_start)} - {_fmt(window_end)}",
+            )
+
+        cd_start, cd_end = self.start_day, self.end_day
+        window_start = last_period + timedelta(days=cd_start - 1)
+        window_end = last_period + timedelta(days=cd_end - 1)
+
+        if window_end < (today or date.today()):
+            if cycle_range_min and cycle_range_max:
+                next_start = last_period + timedelta(days=cycle_range_min + cd_start - 1)
+                next_end = last_period + timedelta(days=cycle_range_max + cd_end - 1)
+                msg = f"This cycle's window has passed. Next window (approximate due to irregular cycle): {_fmt(next_start)} - {_fmt(next_end)}"
+            else:
+                next_lp = last_period + timedelta(days=cycle_length)
+                next_start = next_lp + timedelta(days=cd_start - 1)
+                next_end = next_lp + timedelta(days=cd_end - 1)
+                msg = f"This cycle's window has passed. Next window: {_fmt(next_start)} - {_fmt(next_end)}"
+            return CycleWindow(
+                cycle_dependent=True,
+                window_passed=True,
+                next_valid_start=next_start,
+                next_valid_end=next_end,
+                message=msg,
+            )
+
+        return CycleWindow(
+            cycle_dependent=True,
+            valid_start=window_start,
+            valid_end=window_end,
+            message=f"Valid booking window: {_fmt(window_start)} - {_fmt(window_end)} (cycle days {cd_start}-{cd_end})",
+        )
+
+
+class LabRule:
+    """Lab work required before the visit, optionally only below an age limit."""
+    __slots__ = ("tests", "description", "max_age")
+
+    def __init__(self, tests: tuple[str, ...], description: str, max_age: int | None = None):
+        self.tests = tests
+        self.description = description
+        self.max_age = max_age
+
+    @classmethod
+    def parse(cls, value) -> "LabRule | None":
+        if value is None:
+            return None
+        if not isinstance(value, dict):
+            raise ConditionError(f"lab must be a mapping, got {value!r}")
+        rule = value.get("condition") or "always"
+        if rule == "always":
+            max_age = None
+        elif m := _AGE_UNDER.fullmatch(rule):
+            max_age = int(m.group(1))
+        else:
+            raise ConditionError(f"lab.condition must be 'always' or 'age_under_<N>', got {rule!r}")
+        tests = value.get("test") or value.get("tests") or ()
+        if isinstance(tests, str):
+            tests = (tests,)
+        if not all(isinstance(t, str) for t in tests):
+            raise ConditionError(f"lab.test(s) must be text, got {tests!r}")
+        description = value.get("description")
+        if not isinstance(description, str):
+            raise ConditionError("lab.description is required")
+        return cls(tuple(tests), description, max_age)
+
+    def applies(self, patient_age: int | None) -> bool:
+        """Unknown age counts as required, so staff still see the lab."""
+        return self.max_age is None or patient_age is None or patient_age < self.max_age
+
+
+class Questionnaire:
+    __slots__ = ("name", "link")
+
+    def __init__(self, name: str, link: str | None = None):
+        self.name = name
+        self.link = link
+
+    @classmethod
+    def parse(cls, value) -> "Questionnaire":
+        if isinstance(value, str):
+            return cls(value)
+        if isinstance(value, dict) and isinstance(value.get("name"), str):
+            return cls(value["name"], value.get("link") or None)
+        raise ConditionError(f"questionnaire must be a name or {{name, link}}, got {value!r}")
+
+
+def _optional(raw: dict, key: str, kind, what: str):
+    value = raw.get(key)
+    if value is not None and (not isinstance(value, kind) or isinstance(value, bool) and kind is not bool):
+        raise ConditionError(f"{key} must be {what}, got {value!r}")
+    return value
+
+
+def _text_list(raw: dict, key: str) -> tuple[str, ...]:
+    value = raw.get(key) or ()
+    if not isinstance(value, (list, tuple)) or not all(isinstance(v, str) for v in value):
+        raise ConditionError(f"{key} must be a list of text, got {value!r}")
+    return tuple(value)
+
+
+class Condition:
+    """One compiled condition. `raw` is the YAML dict it was compiled from."""
+    __slots__ = (
+        "id", "name", "category", "doctor", "duration", "cycle", "lab", "questionnaires",
+        "guidance_document", "self_pay_price_dkk", "preparation_instructions",
+        "companion_required", "estimated_recovery", "equipment", "followup_interval",
+        "visits_required", "contraindications", "confirmation_template", "raw",
+    )
+
+    def __init__(self, raw: dict):
+        cid = raw.get("id")
+        if not isinstance(cid, int) or isinstance(cid, bool):
+            raise ConditionError(f"condition id must be an integer, got {cid!r}")
+        try:
+            self.id = cid
+            self.name = raw.get("name")
+            if not isinstance(self.name, str) or not self.name.strip():
+                raise ConditionError("name is required")
+            self.category = raw.get("category")
+            if self.category not in CATEGORIES:
+                raise ConditionError(f"category must be one of {', '.join(CATEGORIES)}, got {self.category!r}")
+            self.doctor = _optional(raw, "doctor", str, "text")
+            self.duration = _optional(raw, "duration", int, "minutes")
+            self.cycle = CycleRule.parse(raw.get("cycle_days"))
+            self.lab = LabRule.parse(raw.get("lab"))
+            self.questionnaires = tuple(Questionnaire.parse(q) for q in raw.get("questionnaires") or ())
+            self.guidance_document = _optional(raw, "guidance_document", str, "text")
+            self.self_pay_price_dkk = _optional(raw, "self_pay_price_dkk", (int, float), "a number")
+            self.preparation_instructions = _text_list(raw, "preparation_instructions")
+            self.companion_required = bool(raw.get("companion_required"))
+            self.estimated_recovery = _optional(raw, "estimated_recovery", str, "text")
+            self.equipment = _text_list(raw, "equipment")
+            self.followup_interval = _optional(raw, "followup_interval", str, "text")
+            self.visits_required = _optional(raw, "visits_required", int, "a whole number")
+            self.contraindications = _text_list(raw, "contraindications")
+            self.confirmation_template = self._templates(raw.get("confirmation_template"))
+        except ConditionError as e:
+            raise ConditionError(f"condition {cid}: {e}") from None
+        self.raw = raw
+
+    @staticmethod
+    def _templates(value) -> dict[str, dict[str, str]]:
+        value = value or {}
+        if not isinstance(value, dict) or not all(
+            isinstance(lines, dict) and all(isinstance(t, str) for t in lines.values())
+            for lines in value.values()
+        ):
+            raise ConditionError("confirmation_template must map language -> {line: text}")
+        for language, lines in value.items():
+            for key, text in lines.items():
+                if key not in TEMPLATE_FIELDS:
+                    raise ConditionError(f"confirmation_template {language}.{key}: unknown line "
+                                         f"(use {', '.join(TEMPLATE_FIELDS)})")
+                allowed = TEMPLATE_FIELDS[key]
+                try:
+                    fields = [p[1:] for p in string.Formatter().parse(text) if p[1] is not None]
+                except ValueError as e:
+                    raise ConditionError(f"confirmation_template {language}.{key}: {e} "
+                                         "(write {{ and }} for literal braces)") from None
+                for field, spec, conversion in fields:
+                    if field not in allowed or spec or conversion:
+                        hint = ", ".join(f"{{{f}}}" for f in allowed) or "none"
+                        raise ConditionError(f"confirmation_template {language}.{key}: unknown "
+                                             f"placeholder {{{field}}} (allowed: {hint})")
+        return value
+
+    def __repr__(self):
+        return f"Condition({self.id}, {self.name!r})"
+
+
+def compile_conditions(raw_conditions: list[dict]) -> dict[int, Condition]:
+    compiled = {}
+    for raw in raw_conditions:
+        cond = Condition(raw)
+        if cond.id in compiled:
+            raise ConditionError(f"duplicate condition id {cond.id}")
+        compiled[cond.id] = cond
+    return compiled
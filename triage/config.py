@@ -1,131 +1,335 @@
 """Configuration: YAML loading, model settings, condition reference."""
 
+import atexit
+import fcntl
+import logging
 import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 
 import yaml
 from dotenv import load_dotenv
 
+from triage.conditions import Condition, ConditionError, compile_conditions
+
 # Project paths
 PROJECT_DIR = Path(__file__).resolve().parent.parent
-DB_DIR = PROJECT_DIR / "data"
+# TRIAGE_DATA_DIR moves the SQLite databases elsewhere (e.g. a throwaway load-test run)
+DB_DIR = Path(os.getenv("TRIAGE_DATA_DIR") or PROJECT_DIR / "data")
 DB_DIR.mkdir(exist_ok=True)
 
 load_dotenv(PROJECT_DIR / ".env")
 
+logger = logging.getLogger("triage.config")
+
 MODEL = os.getenv("TRIAGE_MODEL", "gpt-5.4")
+# "openai", or "stub" to run every agent on the offline StubModel (triage.stub_model)
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "openai")
+STUB_MODEL_SCRIPT = os.getenv("STUB_MODEL_SCRIPT") or None
+STUB_MODEL_LATENCY_MS = os.getenv("STUB_MODEL_LATENCY_MS", "0")
 
 # Booking-confirmation settings
 SMS_PROVIDER = os.getenv("SMS_PROVIDER", "console")
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
 CONFIRMATION_TTL_HOURS = int(os.getenv("CONFIRMATION_TTL_HOURS", "48"))
+# Expired/used confirmation links keep answering "expired"/"already confirmed" this long
+CONFIRMATION_TOKEN_RETENTION_HOURS = int(os.getenv("CONFIRMATION_TOKEN_RETENTION_HOURS", "168"))
+
+# Triage replay window: messages replayed verbatim each turn (older ones are compacted)
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "12"))
 
 # =============================================================================
 # Load YAML Config (mutable — supports runtime reload)
 # =============================================================================
+# Several server workers may serve the same conditions.yaml. Each one checks the
+# file's version stamp (mtime, size, inode) at most every CONFIG_CHECK_INTERVAL seconds
+# and reloads when another worker has saved an edit.
+
+CONFIG_PATH = PROJECT_DIR / "conditions.yaml"
+CONFIG_LOCK_PATH = DB_DIR / "conditions.lock"
+CONFIG_CHECK_INTERVAL = float(os.getenv("CONFIG_CHECK_INTERVAL", "1.0"))
+# Seconds to batch condition edits before writing the file (0 = write on every edit)
+CONFIG_SAVE_DEBOUNCE = float(os.getenv("CONFIG_SAVE_DEBOUNCE", "0"))
+
+_reload_lock = threading.RLock()
+_loaded_stamp: tuple[int, int, int] | None = None
+_next_check = 0.0
+# Bumped on every _rebuild(); see config_version()
+_generation = 0
+# Edit journal: (op, condition_id, data) applied in memory but not yet written to
+# the file. Replayed on every reload, so other workers' saves never drop them.
+_journal: list[tuple[str, int, dict]] = []
+_flush_timer: threading.Timer | None = None
+
+
+def _file_stamp() -> tuple[int, int, int]:
+    st = os.stat(CONFIG_PATH)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
 
 def _load_yaml():
-    with open(PROJECT_DIR / "conditions.yaml") as f:
-        return yaml.safe_load(f)
+    global _loaded_stamp
+    # Stamp first: an edit landing mid-read then shows up as a newer stamp next check
+    stamp = _file_stamp()
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+    _loaded_stamp = stamp
+    return config
 
 _CONFIG = _load_yaml()
 CONDITIONS: dict[int, dict] = {c["id"]: c for c in _CONFIG["conditions"]}
 GROUPS: list[dict] = _CONFIG["condition_groups"]
+# Compiled, validated view of CONDITIONS (see triage.conditions); fails fast on bad YAML
+COMPILED: dict[int, Condition] = compile_conditions(_CONFIG["conditions"])
+
+
+def _sync(force: bool = False):
+    """Reload if another worker changed conditions.yaml (throttled unless force)."""
+    global _next_check
+    now = time.monotonic()
+    if not force and now < _next_check:
+        return
+    _next_check = now + CONFIG_CHECK_INTERVAL
+    with _reload_lock:
+        if _file_stamp() == _loaded_stamp:
+            return
+        try:
+            reload_conditions()
+        except yaml.YAMLError:
+            _next_check = 0.0  # caught another worker mid-write; retry on the next call
+        except ConditionError as e:
+            logger.error("conditions.yaml changed but is invalid, keeping the loaded conditions: %s", e)
+
+
+def config_version() -> int:
+    """Version of the live conditions; changes on every reload or edit, from any worker."""
+    _sync()
+    return _generation
 
 
 def get_conditions() -> dict[int, dict]:
     """Get the current conditions dict (supports dynamic reload)."""
+    _sync()
     return CONDITIONS
 
 
+def get_condition(condition_id: int | None) -> Condition | None:
+    """The compiled condition for an id, or None if there is no such condition."""
+    _sync()
+    return COMPILED.get(condition_id)
+
+
 def get_condition_reference() -> str:
     """Get the current condition reference string (supports dynamic reload)."""
+    _sync()
     return CONDITION_REFERENCE
 
 
-def reload_conditions():
-    """Reload conditions from YAML and rebuild the reference. No server restart needed."""
-    global _CONFIG, CONDITIONS, GROUPS, CONDITION_REFERENCE
-    _CONFIG = _load_yaml()
+def _apply(config: dict, op: str, condition_id: int, data: dict):
+    conditions = config["conditions"]
+    if op == "update":
+        for c in conditions:
+            if c["id"] == condition_id:
+                c.update(data)
+                c["id"] = condition_id  # preserve id
+                break
+    elif not any(c["id"] == condition_id for c in conditions):
+        conditions.append(data)
+
+
+def _rebuild(config: dict):
+    """Make config live: compile it (raising ConditionError before anything changes),
+    then refresh the lookup tables and the reference."""
+    global _CONFIG, CONDITION_REFERENCE, _generation
+    compiled = compile_conditions(config["conditions"])
+    _CONFIG = config
     CONDITIONS.clear()
-    CONDITIONS.update({c["id"]: c for c in _CONFIG["conditions"]})
+    CONDITIONS.update({c["id"]: c for c in config["conditions"]})
+    COMPILED.clear()
+    COMPILED.update(compiled)
     GROUPS.clear()
-    GROUPS.extend(_CONFIG["condition_groups"])
+    GROUPS.extend(config["condition_groups"])
     CONDITION_REFERENCE = build_condition_reference()
+    _generation += 1
+
+
+def reload_conditions():
+    """Reload conditions from YAML and rebuild the reference. No server restart needed.
+    Edits not yet saved are re-applied on top. An invalid file raises ConditionError
+    and leaves the loaded conditions in place."""
+    with _reload_lock:
+        config = _load_yaml()
+        for edit in _journal:
+            _apply(config, *edit)
+        _rebuild(config)
+
+
+def _write_atomic(config: dict):
+    """Write config to a temp file beside conditions.yaml, fsync, then rename over it:
+    readers and crashes only ever see the old file or the complete new one."""
+    fd, tmp = tempfile.mkstemp(dir=CONFIG_PATH.parent, prefix=".conditions.", suffix=".tmp")
+    try:
+        os.chmod(tmp, os.stat(CONFIG_PATH).st_mode & 0o777)
+        with os.fdopen(fd, "w") as f:
+            yaml.dump(config, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, CONFIG_PATH)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    dir_fd = os.open(CONFIG_PATH.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
 
 def save_conditions():
-    """Save current config back to YAML."""
-    with open(PROJECT_DIR / "conditions.yaml", "w") as f:
-        yaml.dump(_CONFIG, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
+    """Write pending edits to conditions.yaml. Holds the cross-worker file lock and
+    merges onto the latest file, so edits saved meanwhile by other workers are kept."""
+    global _loaded_stamp, _flush_timer
+    with _reload_lock, open(CONFIG_LOCK_PATH, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if _file_stamp() != _loaded_stamp:
+            reload_conditions()
+        _write_atomic(_CONFIG)
+        _loaded_stamp = _file_stamp()
+        _journal.clear()
+
+
+def _record_edit(op: str, condition_id: int, data: dict):
+    """Validate an edit, apply it in memory at once, and persist it now or after
+    CONFIG_SAVE_DEBOUNCE. An invalid edit raises ConditionError and changes nothing;
+    so does an immediate save that fails (the edit is rolled back, the error re-raised)."""
+    global _flush_timer
+    with _reload_lock:
+        if op == "update":
+            Condition({**CONDITIONS[condition_id], **data, "id": condition_id})
+        elif condition_id in CONDITIONS:
+            raise ConditionError(f"duplicate condition id {condition_id}")
+        else:
+            Condition(data)
+        edit = (op, condition_id, data)
+        _journal.append(edit)
+        _apply(_CONFIG, op, condition_id, data)
+        _refresh_condition(Condition(CONDITIONS[condition_id] if op == "update" else data))
+        if CONFIG_SAVE_DEBOUNCE <= 0:
+            try:
+                save_conditions()
+            except BaseException:
+                # Back to the file plus any other unsaved edits
+                del _journal[next(i for i, e in enumerate(_journal) if e is edit)]
+                reload_conditions()
+                raise
+            return
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+        _flush_timer = threading.Timer(CONFIG_SAVE_DEBOUNCE, save_conditions)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+@atexit.register
+def _flush_pending():
+    if _journal:
+        save_conditions()
 
 
 def update_condition(condition_id: int, data: dict):
     """Update a single condition in the config and save."""
-    for i, c in enumerate(_CONFIG["conditions"]):
-        if c["id"] == condition_id:
-            _CONFIG["conditions"][i].update(data)
-            _CONFIG["conditions"][i]["id"] = condition_id  # preserve id
-            break
-    save_conditions()
-    reload_conditions()
+    _record_edit("update", condition_id, data)
 
 
 def add_condition(data: dict):
     """Add a new condition to the config and save."""
-    _CONFIG["conditions"].append(data)
-    save_conditions()
-    reload_conditions()
+    _record_edit("add", data["id"], data)
 
 
 # =============================================================================
 # Build Condition Reference (injected into agent prompt)
 # =============================================================================
 
-def build_condition_reference() -> str:
-    """Generate a compact reference table of all conditions and groups for the LLM prompt."""
-    lines = ["=== CONDITION REFERENCE ==="]
+CATEGORY_LABELS = {
+    "A": "CATEGORY A (Urgent — escalate to staff)",
+    "B": "CATEGORY B (Semi-urgent — book within 1-2 weeks)",
+    "C": "CATEGORY C (Standard)",
+}
 
-    cat_labels = {
-        "A": "CATEGORY A (Urgent — escalate to staff)",
-        "B": "CATEGORY B (Semi-urgent — book within 1-2 weeks)",
-        "C": "CATEGORY C (Standard)",
-    }
-    by_cat: dict[str, list] = {"A": [], "B": [], "C": []}
-    for cond in _CONFIG["conditions"]:
-        by_cat[cond["category"]].append(cond)
+# The reference in rendered pieces: condition id -> (category, text) in conditions.yaml
+# order, plus the groups section. An edit re-renders one piece; the rest keep their
+# bytes and order, so the prompt prefix before the edited condition stays cacheable.
+_fragments: dict[int, tuple[str, str]] = {}
+_groups_fragment = ""
 
-    for cat in ("A", "B", "C"):
-        lines.append(f"\n--- {cat_labels[cat]} ---")
-        for c in by_cat[cat]:
-            desc = c.get("description", c["name"])
-            lines.append(f"  [{c['id']}] {c['name']}: {desc}")
-            if c.get("special_instructions"):
-                si_lines = c["special_instructions"].strip().split("\n")
-                lines.append(f"    ⚠ {si_lines[0]}")
-                for si_line in si_lines[1:]:
-                    lines.append(f"      {si_line}")
-            if c.get("contraindications"):
-                lines.append(f"    ⛔ Contraindications: {', '.join(c['contraindications'])}")
-            if c.get("age_range"):
-                ar = c["age_range"]
-                ar_parts = []
-                if ar.get("min"):
-                    ar_parts.append(f"min {ar['min']}")
-                if ar.get("max"):
-                    ar_parts.append(f"max {ar['max']}")
-                if ar_parts:
-                    lines.append(f"    🔢 Age range: {', '.join(ar_parts)}")
-
-    lines.append("\n=== CONDITION GROUPS (ask clarifying question before assigning) ===")
-    for group in GROUPS:
+
+def _render_condition(c: dict) -> str:
+    desc = c.get("description", c["name"])
+    lines = [f"  [{c['id']}] {c['name']}: {desc}"]
+    if c.get("special_instructions"):
+        si_lines = c["special_instructions"].strip().split("\n")
+        lines.append(f"    ⚠ {si_lines[0]}")
+        for si_line in si_lines[1:]:
+            lines.append(f"      {si_line}")
+    if c.get("contraindications"):
+        lines.append(f"    ⛔ Contraindications: {', '.join(c['contraindications'])}")
+    if c.get("age_range"):
+        ar = c["age_range"]
+        ar_parts = []
+        if ar.get("min"):
+            ar_parts.append(f"min {ar['min']}")
+        if ar.get("max"):
+            ar_parts.append(f"max {ar['max']}")
+        if ar_parts:
+            lines.append(f"    🔢 Age range: {', '.join(ar_parts)}")
+    return "\n".join(lines)
+
+
+def _render_groups(groups: list[dict]) -> str:
+    lines = ["\n=== CONDITION GROUPS (ask clarifying question before assigning) ==="]
+    for group in groups:
         desc = group.get("description", "")
         lines.append(f"\n  GROUP: {group['group']} — {desc}")
         lines.append(f"  Ask: \"{group['clarifying_question']}\"")
         for opt in group["options"]:
             lines.append(f"    - {opt['label']} → condition [{opt['condition_id']}]")
+    return "\n".join(lines)
+
 
+def _join_reference() -> str:
+    lines = ["=== CONDITION REFERENCE ==="]
+    for cat in ("A", "B", "C"):
+        lines.append(f"\n--- {CATEGORY_LABELS[cat]} ---")
+        lines.extend(text for category, text in _fragments.values() if category == cat)
+    lines.append(_groups_fragment)
     return "\n".join(lines)
 
 
+def build_condition_reference() -> str:
+    """Generate a compact reference table of all conditions and groups for the LLM prompt."""
+    global _groups_fragment
+    _fragments.clear()
+    for c in _CONFIG["conditions"]:
+        _fragments[c["id"]] = (c["category"], _render_condition(c))
+    _groups_fragment = _render_groups(GROUPS)
+    return _join_reference()
+
+
+def _refresh_condition(cond: Condition):
+    """Make one edited condition live without a full rebuild: re-render only its
+    reference fragment and re-join."""
+    global CONDITION_REFERENCE, _generation
+    CONDITIONS[cond.id] = cond.raw
+    COMPILED[cond.id] = cond
+    _fragments[cond.id] = (cond.category, _render_condition(cond.raw))
+    CONDITION_REFERENCE = _join_reference()
+    _generation += 1
+
+
 CONDITION_REFERENCE = build_condition_reference()
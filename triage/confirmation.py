@@ -0,0 +1,169 @@
+"""Deterministic (da/en) booking confirmation text — no LLM.
+
+render_confirmation() phrases the same facts build_confirmation_context() hands the
+confirmation agent. Condition-specific free text (lab, preparation, recovery) comes
+from the optional `confirmation_template` block in conditions.yaml:
+
+    confirmation_template:
+      da:
+        reason: ...        # replaces the generic "request received" line
+        lab: ...
+        preparation: ...
+        recovery: ...
+      en:
+        lab: ...
+
+The lab and recovery lines may use {lab} / {recovery}; the others are plain text
+(write {{ and }} for literal braces). Condition rejects any other placeholder when
+the file is loaded or edited, so rendering never meets an unknown field.
+
+Built-in lines cover everything else. When a booking carries a fact that has no line
+in the patient's language (or the language is not da/en), it returns None and the
+caller falls back to the confirmation agent.
+"""
+
+from datetime import date
+
+from triage.config import get_condition
+from triage.models import TriageData, BookingRequest
+from triage.tools import cycle_window
+
+CLINIC_NAME = "Gynækologerne Skensved og Bune"
+
+MONTHS = {
+    "en": ["January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December"],
+    "da": ["januar", "februar", "marts", "april", "maj", "juni", "juli",
+           "august", "september", "oktober", "november", "december"],
+}
+
+LINES = {
+    "en": {
+        "thanks": "Thank you, {name}!",
+        "thanks_anon": "Thank you!",
+        "reason": "We have received your booking request for: {condition}.",
+        "reason_generic": "We have received your booking request.",
+        "specialist": "The clinic will arrange your appointment with the appropriate specialist.",
+        "window": "Because the timing depends on your cycle, the appointment should be between {start} and {end}.",
+        "window_next": "This cycle's window has passed, so the appointment will be planned for your next cycle, between {start} and {end}.",
+        "provera": "The doctor may prescribe Provera to bring on a period before the appointment.",
+        "lab": "Before your visit: {lab}",
+        "questionnaire": "Please fill in this questionnaire before your visit: {questionnaire}",
+        "guidance": "You will receive our guidance document \"{document}\" to read before your visit.",
+        "self_pay": "As you do not have a referral, this is a self-pay appointment.",
+        "self_pay_price": "As you do not have a referral, this is a self-pay appointment ({price} DKK).",
+        "preparation": "To prepare for your visit:",
+        "companion": "Please arrange for someone to drive you home after the procedure.",
+        "recovery": "Expected recovery: {recovery}",
+        "visits": "This usually requires {visits} visits.",
+        "callback": "We will call you at {phone} to confirm the appointment.",
+        "callback_anon": "We will contact you to confirm the appointment.",
+        "closing": "Best regards,\n" + CLINIC_NAME,
+    },
+    "da": {
+        "thanks": "Tak, {name}!",
+        "thanks_anon": "Tak for din henvendelse!",
+        "reason_generic": "Vi har modtaget din bookingforespørgsel.",
+        "specialist": "Klinikken sørger for, at du får en tid hos den rette speciallæge.",
+        "window": "Da tidspunktet afhænger af din cyklus, bør besøget ligge mellem {start} og {end}.",
+        "window_next": "Vinduet i denne cyklus er passeret, så besøget planlægges i din næste cyklus mellem {start} og {end}.",
+        "provera": "Lægen kan eventuelt ordinere Provera for at fremkalde en menstruation før besøget.",
+        "questionnaire": "Udfyld venligst dette spørgeskema før dit besøg: {questionnaire}",
+        "guidance": "Du modtager vores vejledning \"{document}\", som du bedes læse før besøget.",
+        "self_pay": "Da du ikke har en henvisning, er der tale om en selvbetalt konsultation.",
+        "self_pay_price": "Da du ikke har en henvisning, er der tale om en selvbetalt konsultation ({price} kr.).",
+        "companion": "Sørg for at have en, der kan køre dig hjem efter indgrebet.",
+        "visits": "Forløbet kræver normalt {visits} besøg.",
+        "callback": "Vi ringer til dig på {phone} for at bekræfte tidspunktet.",
+        "callback_anon": "Vi kontakter dig for at bekræfte tidspunktet.",
+        "closing": "Venlig hilsen\n" + CLINIC_NAME,
+    },
+}
+
+
+def _format_date(d: date, language: str) -> str:
+    month = MONTHS[language][d.month - 1]
+    return f"{d.day}. {month}" if language == "da" else f"{month} {d.day}"
+
+
+def _window_line(triage: TriageData, language: str) -> str | None:
+    """The cycle window as a sentence; None if it cannot be computed."""
+    try:
+        window = cycle_window(triage.last_period_date, triage.condition_id, triage.cycle_length or 28)
+    except (TypeError, ValueError):
+        return None
+    lines = LINES[language]
+    if window.window_passed:
+        return lines["window_next"].format(
+            start=_format_date(window.next_valid_start, language),
+            end=_format_date(window.next_valid_end, language),
+        )
+    if window.valid_start:
+        return lines["window"].format(
+            start=_format_date(window.valid_start, language),
+            end=_format_date(window.valid_end, language),
+        )
+    return None
+
+
+def render_confirmation(triage: TriageData, booking: BookingRequest) -> str | None:
+    """Patient confirmation for a booking, or None if the templates cannot express it."""
+    language = triage.language
+    if language not in LINES:
+        return None
+    lines = LINES[language]
+    cond = get_condition(triage.condition_id)
+    template = (cond.confirmation_template.get(language) if cond else None) or {}
+
+    def line(key: str, **values) -> str | None:
+        """Condition template first, then the built-in line; None if neither exists."""
+        text = template.get(key) or lines.get(key)
+        return text.format(**values) if text else None
+
+    parts = [lines["thanks"].format(name=triage.patient_name) if triage.patient_name else lines["thanks_anon"]]
+    if template.get("reason"):
+        parts.append(template["reason"].format())
+    elif triage.condition_name and "reason" in lines:
+        parts.append(lines["reason"].format(condition=triage.condition_name))
+    else:
+        parts.append(lines["reason_generic"])
+    parts.append(lines["specialist"])
+
+    body = []
+    if booking.cycle_dependent and booking.valid_booking_window:
+        window = _window_line(triage, language)
+        if window is None:
+            return None
+        body.append(window)
+    if booking.provera_recommended:
+        body.append(lines["provera"])
+    if booking.lab_required:
+        body.append(line("lab", lab=booking.lab_details))
+    if booking.questionnaire:
+        body.append(lines["questionnaire"].format(questionnaire=booking.questionnaire))
+    if booking.guidance_document:
+        body.append(lines["guidance"].format(document=booking.guidance_document))
+    if booking.self_pay:
+        if booking.self_pay_price_dkk:
+            price = f"{booking.self_pay_price_dkk:g}"
+            body.append(lines["self_pay_price"].format(price=price))
+        else:
+            body.append(lines["self_pay"])
+    if booking.preparation_instructions:
+        if template.get("preparation"):
+            body.append(template["preparation"].format())
+        elif "preparation" in lines:
+            body.append("\n".join([lines["preparation"]] + [f"- {p}" for p in booking.preparation_instructions]))
+        else:
+            body.append(None)
+    if booking.companion_required:
+        body.append(lines["companion"])
+    if booking.estimated_recovery:
+        body.append(line("recovery", recovery=booking.estimated_recovery))
+    if booking.visits_required and booking.visits_required > 1:
+        body.append(lines["visits"].format(visits=booking.visits_required))
+    if None in body:
+        return None
+
+    callback = lines["callback"].format(phone=triage.phone_number) if triage.phone_number else lines["callback_anon"]
+    return "\n\n".join([" ".join(parts)] + body + [callback, lines["closing"]])
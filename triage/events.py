@@ -0,0 +1,54 @@
+"""In-process event bus for live inbox updates (fan-out to SSE subscribers)."""
+
+import asyncio
+import json
+
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15.0
+
+
+class InboxEventBus:
+    """Fans out inbox row deltas to every connected subscriber.
+
+    Must be used from the event loop thread. A subscriber that falls more than
+    SUBSCRIBER_QUEUE_SIZE events behind gets its backlog replaced by a single
+    "resync" event, telling the client to reload instead of replaying.
+    """
+
+    def __init__(self):
+        self._subscribers: set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: str, data: dict):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+
+    async def stream(self):
+        """Yield Server-Sent Events frames for one subscriber until cancelled."""
+        queue = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+
+inbox_events = InboxEventBus()
@@ -0,0 +1,249 @@
+"""Bounded conversation replay for the triage agent.
+
+TriageSession stores the full transcript like SQLiteSession, but replays only a
+window: the last HISTORY_WINDOW_MESSAGES messages (cut at a patient message, so
+tool calls stay paired with their outputs), preceded by one compact state message
+for everything older: the TriageData fields already collected, the condition details
+fetched so far and a short excerpt of the earlier exchanges. Per-turn input stays
+bounded however long the chat runs.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from agents import SQLiteSession
+
+from triage.config import HISTORY_WINDOW_MESSAGES
+from triage.models import TriageData
+
+DIGEST_MAX_LINES = 30
+DIGEST_PATIENT_CHARS = 300
+DIGEST_AGENT_CHARS = 160
+# Numbers in patient messages that look like a CPR or phone number; only ever shown
+# to the agent as unconfirmed (free text cannot settle a TriageData field)
+_CPR = re.compile(r"(?<!\d)(\d{6})[- ]?(\d{4})(?!\d)")
+_PHONE = re.compile(r"(?<![\d+])(?:\+?45[ ]?)?((?:\d[ ]?){7}\d)(?!\d)")
+# PRAGMA user_version of the SDK database once migrate_sdk_history() has run
+SDK_HISTORY_VERSION = 1
+
+
+def _text(item: dict) -> str:
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _is_message(item: dict) -> bool:
+    return item.get("role") in ("user", "assistant") and item.get("type", "message") == "message"
+
+
+def condition_fields(output) -> dict:
+    """Routing fields from a fetch_condition_details output (JSON text or dict)."""
+    try:
+        data = json.loads(output) if isinstance(output, str) else output
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict) or "id" not in data or "name" not in data:
+        return {}
+    fields = {"condition_id": data["id"], "condition_name": data["name"], "category": data.get("category")}
+    if data.get("doctor"):
+        fields["doctor"] = data["doctor"]
+    if data.get("duration"):
+        fields["duration_minutes"] = data["duration"]
+    return fields
+
+
+def collected_fields(items: list[dict]) -> dict:
+    """TriageData fields established by structured items, later values winning: the
+    fetched condition's routing fields and the arguments of complete_triage calls
+    (also rejected ones)."""
+    fields = {}
+    tool_names = {}
+    for item in items:
+        kind = item.get("type")
+        if kind == "function_call":
+            tool_names[item.get("call_id")] = item.get("name")
+            if item.get("name") == "complete_triage":
+                try:
+                    data = json.loads(item.get("arguments") or "{}").get("data") or {}
+                except (json.JSONDecodeError, AttributeError):
+                    data = {}
+                if isinstance(data, dict):
+                    fields.update({k: v for k, v in data.items() if v not in (None, False, "")})
+        elif kind == "function_call_output" and tool_names.get(item.get("call_id")) == "fetch_condition_details":
+            fields.update(condition_fields(item.get("output")))
+    return {name: fields[name] for name in TriageData.model_fields if name in fields}
+
+
+def mentioned_numbers(items: list[dict]) -> dict[str, list[str]]:
+    """CPR- and phone-like numbers in patient messages, in order and de-duplicated.
+    Unverified: a number can belong to someone else or be mistyped."""
+    found = {"cpr_number": [], "phone_number": []}
+    for item in items:
+        if not (_is_message(item) and item["role"] == "user"):
+            continue
+        text = _text(item)
+        for m in _CPR.finditer(text):
+            found["cpr_number"].append(f"{m.group(1)}-{m.group(2)}")
+        for m in _PHONE.finditer(_CPR.sub(" ", text)):
+            found["phone_number"].append(re.sub(r"\D", "", m.group(1)))
+    return {name: list(dict.fromkeys(values)) for name, values in found.items() if values}
+
+
+def _state_message(dropped: list[dict]) -> dict:
+    """One developer message standing in for the dropped part of the history."""
+    tool_names = {}
+    condition = None
+    exchanges = []
+    for item in dropped:
+        kind = item.get("type")
+        if kind == "function_call":
+            tool_names[item.get("call_id")] = item.get("name")
+        elif kind == "function_call_output" and tool_names.get(item.get("call_id")) == "fetch_condition_details":
+            condition = item.get("output")
+        elif _is_message(item):
+            if item["role"] == "user":
+                exchanges.append(f"Patient: {_clip(_text(item), DIGEST_PATIENT_CHARS)}")
+            else:
+                exchanges.append(f"Agent: {_clip(_text(item), DIGEST_AGENT_CHARS)}")
+
+    lines = ["EARLIER IN THIS CONVERSATION (compacted)."]
+    collected = collected_fields(dropped)
+    if collected:
+        lines.append("Triage fields already collected — do not ask for these again:")
+        lines.extend(f"  {name}: {json.dumps(value, ensure_ascii=False)}" for name, value in collected.items())
+    mentioned = {name: values for name, values in mentioned_numbers(dropped).items() if name not in collected}
+    if mentioned:
+        lines.append("Numbers the patient wrote earlier (UNCONFIRMED — read back to the patient "
+                     "and confirm before using):")
+        lines.extend(f"  {name}? {', '.join(values)}" for name, values in mentioned.items())
+    if condition:
+        if not isinstance(condition, str):
+            condition = json.dumps(condition, ensure_ascii=False)
+        lines.append(f"Condition details already fetched (fetch_condition_details):\n{condition}")
+    if len(exchanges) > DIGEST_MAX_LINES:
+        # Intake facts cluster at the start, the latest context at the end
+        head = DIGEST_MAX_LINES // 3
+        exchanges = exchanges[:head] + ["…"] + exchanges[head - DIGEST_MAX_LINES:]
+    lines.append("Excerpt of the earlier messages (may be incomplete; a field not listed "
+                 "as collected above may still need asking):")
+    lines.extend(exchanges)
+    return {"role": "developer", "content": "\n".join(lines)}
+
+
+def window_items(items: list[dict], max_messages: int) -> list[dict]:
+    """The replay for items: unchanged if within max_messages messages, else a state
+    message plus the tail starting at the earliest patient message that fits."""
+    start = None
+    count = 0
+    for i in range(len(items) - 1, -1, -1):
+        if not _is_message(items[i]):
+            continue
+        count += 1
+        if count > max_messages:
+            break
+        if items[i]["role"] == "user":
+            start = i
+    if start is None or not any(_is_message(item) for item in items[:start]):
+        return items
+    return [_state_message(items[:start])] + items[start:]
+
+
+# SDK session-database I/O through TriageSession in this process (see session_io_stats)
+_io_lock = threading.Lock()
+_io_stats = {kind: {"calls": 0, "seconds": 0.0, "max": 0.0} for kind in ("read", "write")}
+
+
+def _record_io(kind: str, seconds: float):
+    with _io_lock:
+        stats = _io_stats[kind]
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+
+def session_io_stats() -> dict:
+    """Cumulative triage_sessions.db reads (get_items) and writes (add_items) for
+    this process: calls, total and longest time. The times include waiting for the
+    SDK's connection lock and SQLite's write lock, which the SDK does not expose."""
+    with _io_lock:
+        return {kind: dict(stats) for kind, stats in _io_stats.items()}
+
+
+class TriageSession(SQLiteSession):
+    """SQLiteSession that replays a bounded window (see module docstring).
+
+    record=False gives a read-only view: internal agents (handoff, confirmation)
+    can read the patient conversation without their prompts and outputs being
+    written into the history the triage agent replays.
+    """
+
+    def __init__(self, session_id: str, db_path, max_messages: int | None = HISTORY_WINDOW_MESSAGES,
+                 record: bool = True):
+        super().__init__(session_id, db_path)
+        self.max_messages = max_messages
+        self.record = record
+
+    def internal_view(self) -> "TriageSession":
+        """Full, read-only history for an internal agent run."""
+        return TriageSession(self.session_id, self.db_path, max_messages=None, record=False)
+
+    async def get_items(self, limit: int | None = None) -> list:
+        started = time.perf_counter()
+        items = await super().get_items(limit)
+        _record_io("read", time.perf_counter() - started)
+        if limit is not None or not self.max_messages:
+            return items
+        return window_items(items, self.max_messages)
+
+    async def add_items(self, items: list) -> None:
+        if self.record:
+            started = time.perf_counter()
+            await super().add_items(items)
+            _record_io("write", time.perf_counter() - started)
+
+
+def migrate_sdk_history(db_path: str | Path):
+    """One-off cleanup of transcripts written while the handoff and confirmation
+    agents still ran on the patient's session: drop their prompts and the handoff
+    agent's structured output. The confirmation agent's text, which the patient saw,
+    stays in the transcript."""
+    if not Path(db_path).exists():
+        return
+    internal_prompt = """json_extract({row}.message_data, '$.role') = 'user'
+        AND (json_extract({row}.message_data, '$.content') LIKE 'Triage data collected%'
+             OR json_extract({row}.message_data, '$.content') LIKE 'Patient language:%')"""
+    with closing(sqlite3.connect(str(db_path))) as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SDK_HISTORY_VERSION:
+            return
+        has_messages = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agent_messages'"
+        ).fetchone()
+        with conn:
+            if has_messages:
+                conn.execute(f"""
+                    DELETE FROM agent_messages WHERE json_valid(message_data) AND (
+                        ({internal_prompt.format(row="agent_messages")})
+                        OR (json_extract(message_data, '$.role') = 'assistant'
+                            AND json_extract(message_data, '$.content[0].text') LIKE '{{%"conversation_summary"%'
+                            AND EXISTS (
+                                SELECT 1 FROM agent_messages p
+                                WHERE p.session_id = agent_messages.session_id AND p.id < agent_messages.id
+                                  AND json_valid(p.message_data) AND {internal_prompt.format(row="p")}
+                            ))
+                    )
+                """)
+            conn.execute(f"PRAGMA user_version = {SDK_HISTORY_VERSION}")
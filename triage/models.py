@@ -76,7 +76,7 @@ class HandoffRequest(BaseModel):
 
 class WSMessage(BaseModel):
     """WebSocket message envelope."""
-    type: str  # "chat", "triage_update", "complete", "status"
+    type: str  # "chat", "chat_delta", "tool_progress", "triage_update", "complete", "confirmation", "status"
     data: dict
 
 
@@ -1,21 +1,18 @@
 """Orchestration logic: triage processing, enrichment, agent turns for web UI."""
 
+import asyncio
 import json
 import uuid
 
 from pydantic import ValidationError
-from agents import Runner, SQLiteSession
+from agents import Runner
 
-from triage.config import get_conditions, DB_DIR
+from triage.config import get_condition, DB_DIR
 from triage.models import TriageData, BookingRequest, HandoffRequest
-from triage.tools import (
-    calculate_cycle_window,
-    get_lab_requirements,
-    get_questionnaire,
-    get_guidance_document,
-    get_self_pay_price,
-)
+from triage.tools import cycle_window, lab_requirements
 from triage.agents import triage_agent, handoff_agent, confirmation_agent
+from triage.confirmation import render_confirmation
+from triage.history import TriageSession, condition_fields
 
 
 # =============================================================================
@@ -44,74 +41,58 @@ def enrich_booking(triage: TriageData) -> BookingRequest:
     if not triage.condition_id:
         return booking
 
-    cond = get_conditions().get(triage.condition_id)
+    cond = get_condition(triage.condition_id)
     if not cond:
         return booking
 
     # Cycle window
-    if cond.get("cycle_days"):
+    if cond.cycle:
         booking.cycle_dependent = True
         if triage.no_periods:
             booking.provera_recommended = True
             booking.notes = "Patient has no regular cycle. Doctor may prescribe Provera to induce a period."
         elif triage.last_period_date:
-            cycle_result = json.loads(calculate_cycle_window(
-                triage.last_period_date,
-                triage.condition_id,
-                triage.cycle_length or 28,
-            ))
-            booking.valid_booking_window = cycle_result.get("message")
-            booking.provera_recommended = cycle_result.get("provera_recommended", False)
+            window = cycle_window(triage.last_period_date, triage.condition_id, triage.cycle_length or 28)
+            booking.valid_booking_window = window.message
+            booking.provera_recommended = window.provera_recommended
 
     # Lab requirements
-    lab_result = json.loads(get_lab_requirements(triage.condition_id, triage.patient_age))
-    booking.lab_required = lab_result.get("lab_required", False)
-    if booking.lab_required:
-        test = lab_result.get("test") or lab_result.get("tests")
-        desc = lab_result.get("description", "")
-        if isinstance(test, list):
-            booking.lab_details = f"{', '.join(test)}. {desc}"
-        else:
-            booking.lab_details = f"{test}. {desc}" if test else desc
+    lab = lab_requirements(triage.condition_id, triage.patient_age)
+    booking.lab_required = lab.lab_required
+    if lab.lab_required:
+        booking.lab_details = lab.details
 
     # Questionnaire
-    q_result = json.loads(get_questionnaire(triage.condition_id))
-    if q_result.get("questionnaires"):
-        parts = []
-        for q in q_result["questionnaires"]:
-            if q.get("link"):
-                parts.append(f"{q['name']} — {q['link']}")
-            else:
-                parts.append(q["name"])
-        booking.questionnaire = ", ".join(parts)
+    if cond.questionnaires:
+        booking.questionnaire = ", ".join(
+            f"{q.name} — {q.link}" if q.link else q.name for q in cond.questionnaires
+        )
 
     # Guidance document
-    g_result = json.loads(get_guidance_document(triage.condition_id))
-    if g_result.get("document"):
-        booking.guidance_document = g_result["document"]
+    if cond.guidance_document:
+        booking.guidance_document = cond.guidance_document
 
     # Self-pay: no referral = patient pays privately
     if triage.has_referral is False:
         booking.self_pay = True
-        price_result = json.loads(get_self_pay_price(triage.condition_id))
-        if price_result.get("price_dkk"):
-            booking.self_pay_price_dkk = price_result["price_dkk"]
+        if cond.self_pay_price_dkk:
+            booking.self_pay_price_dkk = cond.self_pay_price_dkk
 
     # New condition-centric fields
-    if cond.get("preparation_instructions"):
-        booking.preparation_instructions = cond["preparation_instructions"]
-    if cond.get("companion_required"):
+    if cond.preparation_instructions:
+        booking.preparation_instructions = list(cond.preparation_instructions)
+    if cond.companion_required:
         booking.companion_required = True
-    if cond.get("estimated_recovery"):
-        booking.estimated_recovery = cond["estimated_recovery"]
-    if cond.get("equipment"):
-        booking.equipment = cond["equipment"]
-    if cond.get("followup_interval"):
-        booking.followup_interval = cond["followup_interval"]
-    if cond.get("visits_required") is not None:
-        booking.visits_required = cond["visits_required"]
-    if cond.get("contraindications"):
-        booking.contraindications = cond["contraindications"]
+    if cond.estimated_recovery:
+        booking.estimated_recovery = cond.estimated_recovery
+    if cond.equipment:
+        booking.equipment = list(cond.equipment)
+    if cond.followup_interval:
+        booking.followup_interval = cond.followup_interval
+    if cond.visits_required is not None:
+        booking.visits_required = cond.visits_required
+    if cond.contraindications:
+        booking.contraindications = list(cond.contraindications)
 
     return booking
 
@@ -158,14 +139,47 @@ def build_confirmation_context(triage: TriageData, booking: BookingRequest) -> s
 # Handoff
 # =============================================================================
 
-async def run_handoff(triage_data: TriageData, session) -> HandoffRequest:
-    """Run the handoff agent to produce a staff summary."""
+def handoff_reason(triage_data: TriageData) -> str:
     if triage_data.escalation_reason:
-        reason = triage_data.escalation_reason
-    elif triage_data.category == "A":
-        reason = "Category A urgent condition"
+        return triage_data.escalation_reason
+    if triage_data.category == "A":
+        return "Category A urgent condition"
+    return "DSS/private insurance"
+
+
+def build_fast_handoff(triage_data: TriageData) -> HandoffRequest:
+    """Deterministic handoff — no LLM, so staff are alerted at once. Category A is
+    urgent; other escalations (patient request, DSS) get a high-priority callback.
+    The handoff agent's summary is patched in later (see process_completed_triage)."""
+    urgent = triage_data.category == "A"
+    if urgent:
+        summary = [f"URGENT (Category A): {triage_data.condition_name or 'urgent condition'}."]
     else:
-        reason = "DSS/private insurance"
+        summary = [f"Escalated: {triage_data.condition_name or handoff_reason(triage_data)}."]
+    if triage_data.escalation_reason:
+        summary.append(f"Reason: {triage_data.escalation_reason}.")
+    patient = ", ".join(
+        p for p in (
+            triage_data.patient_name,
+            f"age {triage_data.patient_age}" if triage_data.patient_age else None,
+            f"CPR {triage_data.cpr_number}" if triage_data.cpr_number else None,
+        ) if p
+    )
+    if patient:
+        summary.append(f"Patient: {patient}.")
+    summary.append(f"Phone: {triage_data.phone_number or 'not given'}. Language: {triage_data.language}.")
+    return HandoffRequest(
+        triage=triage_data,
+        reason=handoff_reason(triage_data),
+        urgency="immediate" if urgent else "high",
+        conversation_summary=" ".join(summary),
+        suggested_action="Call the patient immediately." if urgent else "Call the patient back.",
+    )
+
+
+async def run_handoff(triage_data: TriageData, session) -> HandoffRequest:
+    """Run the handoff agent to produce a staff summary."""
+    reason = handoff_reason(triage_data)
 
     handoff_input = f"""Triage data collected so far:
 {triage_data.model_dump_json(indent=2)}
@@ -189,68 +203,136 @@ Please produce a HandoffRequest for clinic staff."""
 # Post-triage Processing
 # =============================================================================
 
+BOOKING_FALLBACK_CONFIRMATION = "Your booking request has been submitted."
+
+
+async def generate_confirmation(triage_data: TriageData, booking: BookingRequest) -> str:
+    """Run the confirmation agent for a finished booking and return its text.
+    The context carries every fact it needs, so it runs without a session."""
+    confirmation_input = build_confirmation_context(triage_data, booking)
+    conf_result = await Runner.run(confirmation_agent, confirmation_input)
+    return str(conf_result.final_output)
+
+
 async def process_completed_triage(triage_data: TriageData, session) -> tuple:
     """After triage is complete, run escalation check or enrichment.
-    Returns (result, confirmation_text)."""
-    if triage_data.escalate or triage_data.insurance_type == "dss" or triage_data.category == "A":
-        handoff = await run_handoff(triage_data, session)
-        return handoff, None
+    Returns (result, follow_up).
 
-    booking = enrich_booking(triage_data)
+    For bookings the structured result is ready at once (enrichment is deterministic).
+    follow_up is the templated patient text (str) when render_confirmation can
+    express the booking, otherwise an already-running asyncio.Task of the confirmation
+    agent; the caller awaits or cancels it.
 
-    # Generate confirmation message
-    confirmation_input = build_confirmation_context(triage_data, booking)
-    conf_result = await Runner.run(confirmation_agent, confirmation_input, session=session)
-    confirmation_text = str(conf_result.final_output)
+    Escalations return the deterministic build_fast_handoff() result and, as
+    follow_up, an already-running asyncio.Task of the handoff agent whose summary
+    the caller patches in when ready."""
+    # The handoff agent reads the conversation but must not write into the patient's
+    # session (the triage replay and the staff transcript)
+    if isinstance(session, TriageSession):
+        session = session.internal_view()
+
+    if triage_data.escalate or triage_data.insurance_type == "dss" or triage_data.category == "A":
+        return build_fast_handoff(triage_data), asyncio.create_task(run_handoff(triage_data, session))
 
-    return booking, confirmation_text
+    booking = enrich_booking(triage_data)
+    confirmation = render_confirmation(triage_data, booking)
+    if confirmation is not None:
+        return booking, confirmation
+    return booking, asyncio.create_task(generate_confirmation(triage_data, booking))
 
 
 # =============================================================================
 # Single-Turn Runner (for web UI)
 # =============================================================================
 
+TOOL_PROGRESS_LABELS = {
+    "fetch_condition_details": "Fetching condition details",
+    "complete_triage": "Finalising triage",
+}
+
+
 def extract_partial_triage(result) -> dict:
     """Inspect agent result for partial triage data (condition_id, name, doctor)
     from fetch_condition_details tool calls — without extra LLM calls."""
     partial = {}
     if hasattr(result, "new_items"):
         for item in result.new_items:
-            if hasattr(item, "raw_item") and hasattr(item.raw_item, "type"):
+            # Tool call results; the SDK keeps their raw item as a plain dict
+            if getattr(item, "type", None) == "tool_call_output_item":
                 raw = item.raw_item
-                # Check for tool call results
-                if raw.type == "function_call_output":
-                    try:
-                        data = json.loads(raw.output) if isinstance(raw.output, str) else raw.output
-                        if isinstance(data, dict) and "id" in data and "name" in data:
-                            partial["condition_id"] = data["id"]
-                            partial["condition_name"] = data["name"]
-                            partial["category"] = data.get("category")
-                            if data.get("doctor"):
-                                partial["doctor"] = data["doctor"]
-                            if data.get("duration"):
-                                partial["duration_minutes"] = data["duration"]
-                    except (json.JSONDecodeError, TypeError):
-                        pass
+                partial.update(condition_fields(raw.get("output") if isinstance(raw, dict) else raw.output))
     return partial
 
 
-async def run_agent_turn(session_id: str, message: str, db_path: str | None = None) -> dict:
+async def _run_streamed_turn(message: str, session, on_event):
+    """Run the triage agent with the streamed runner, forwarding frames to on_event as they arrive.
+
+    Emits chat_delta frames for output text and tool_progress frames for tool calls.
+    Returns the finished RunResultStreaming (final_output / new_items as with Runner.run).
+    """
+    result = Runner.run_streamed(triage_agent, message, session=session, max_turns=5)
+    try:
+        async for event in result.stream_events():
+            if event.type == "raw_response_event":
+                if getattr(event.data, "type", None) == "response.output_text.delta" and event.data.delta:
+                    await on_event({"type": "chat_delta", "data": {"delta": event.data.delta}})
+            elif event.type == "run_item_stream_event" and event.name == "tool_called":
+                raw = event.item.raw_item
+                tool = raw.get("name") if isinstance(raw, dict) else getattr(raw, "name", None)
+                await on_event({
+                    "type": "tool_progress",
+                    "data": {"tool": tool, "label": TOOL_PROGRESS_LABELS.get(tool, "Working")},
+                })
+    finally:
+        if not result.is_complete:
+            # on_event raised (e.g. the patient's socket closed) or we were cancelled:
+            # stop the background run instead of leaving it to finish unobserved
+            result.cancel()
+    return result
+
+
+async def record_reply(session_id: str, text: str, db_path: str | None = None):
+    """Append a reply the patient was sent outside a triage run (the escalation
+    notice or booking confirmation) to their session, so the staff transcript shows
+    it. The chat is closed by then, so the triage agent never replays it."""
+    if db_path is None:
+        db_path = str(DB_DIR / "triage_sessions.db")
+    await TriageSession(session_id, db_path).add_items([{"role": "assistant", "content": text}])
+
+
+async def run_agent_turn(
+    session_id: str,
+    message: str,
+    db_path: str | None = None,
+    on_event=None,
+) -> dict:
     """Run a single agent turn. Returns a dict with type, content, and optional triage data.
 
+    If on_event is given, the turn runs in streaming mode: on_event is awaited with
+    incremental {"type": "chat_delta" | "tool_progress", "data": ...} frames while the
+    agent runs. The returned dict is the same in both modes.
+
     Return dict keys:
       - type: "text" | "booking" | "handoff"
-      - content: agent text response or confirmation message
+      - content: agent text response, the escalation message, or the templated
+        booking confirmation (None when confirmation_task is set)
       - triage_data: dict (if triage complete)
       - result: BookingRequest or HandoffRequest dict (if complete)
+      - confirmation_task: asyncio.Task -> confirmation text (bookings the templates
+        cannot express, else None); the caller owns it and must await or cancel it
+      - handoff_task: asyncio.Task -> HandoffRequest from the handoff agent (handoffs,
+        else None); result holds the fast-path handoff until it finishes
       - partial: dict of partial triage fields from tool calls
     """
     if db_path is None:
         db_path = str(DB_DIR / "triage_sessions.db")
 
-    session = SQLiteSession(session_id, db_path)
+    session = TriageSession(session_id, db_path)
 
-    result = await Runner.run(triage_agent, message, session=session, max_turns=5)
+    if on_event is None:
+        result = await Runner.run(triage_agent, message, session=session, max_turns=5)
+    else:
+        result = await _run_streamed_turn(message, session, on_event)
 
     # Extract any partial triage info from tool calls
     partial = extract_partial_triage(result)
@@ -277,19 +359,21 @@ async def run_agent_turn(session_id: str, message: str, db_path: str | None = No
             }
 
     # Triage complete — process it
-    final_result, confirmation = await process_completed_triage(triage_data, session)
+    final_result, follow_up = await process_completed_triage(triage_data, session)
 
     if isinstance(final_result, HandoffRequest):
         return {
             "type": "handoff",
-            "content": confirmation or "Your case has been escalated to our staff.",
+            "content": "Your case has been escalated to our staff.",
             "triage_data": triage_data.model_dump(),
             "result": final_result.model_dump(),
+            "handoff_task": follow_up,
         }
     else:
         return {
             "type": "booking",
-            "content": confirmation or "Your booking request has been submitted.",
+            "content": follow_up if isinstance(follow_up, str) else None,
             "triage_data": triage_data.model_dump(),
             "result": final_result.model_dump(),
+            "confirmation_task": None if isinstance(follow_up, str) else follow_up,
         }
@@ -1,12 +1,20 @@
 """SQLite session metadata store for the dashboard history view."""
 
+import asyncio
+import base64
 import json
 import secrets
-import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+from functools import partial
 from pathlib import Path
 
-from triage.config import CONFIRMATION_TTL_HOURS
+from triage.config import CONFIRMATION_TTL_HOURS, CONFIRMATION_TOKEN_RETENTION_HOURS
+from triage.db import ConnectionPool
 from triage.models import SessionMeta
 
 
@@ -27,6 +35,58 @@ def effective_confirmation_status(row: dict, now: datetime | None = None) -> str
     return status
 
 
+# Inbox sort key: lower ranks first. Stored in sessions.urgency_rank so the
+# (urgency_rank, created_at) ordering can be served by an index.
+URGENCY_RANK = {"immediate": 0, "high": 1, "normal": 2}
+DEFAULT_URGENCY_RANK = 3
+
+INBOX_COLUMNS = (
+    "session_id, created_at, patient_name, status, condition_name, "
+    "result_type, processing_status, processed_by, processing_updated_at, urgency, urgency_rank, "
+    "confirmation_status, confirmation_sent_at, confirmation_confirmed_at, "
+    "confirmation_cancelled_at, phone, cpr, doctor"
+)
+INBOX_ORDER = "ORDER BY urgency_rank ASC, created_at DESC, session_id DESC"
+# On the active board: not yet processed and not a booking the patient cancelled.
+# Also the WHERE of idx_sessions_inbox_open, which a query only uses if it repeats
+# these terms verbatim, so keep the two in sync.
+INBOX_OPEN = (
+    "COALESCE(processing_status, 'new') != 'done' "
+    "AND COALESCE(confirmation_status, 'none') != 'cancelled'"
+)
+INBOX_CLOSED = f"NOT ({INBOX_OPEN})"
+
+
+def urgency_rank(urgency: str | None) -> int:
+    return URGENCY_RANK.get(urgency or "", DEFAULT_URGENCY_RANK)
+
+
+def encode_inbox_cursor(row: dict) -> str:
+    """Opaque keyset cursor pointing just past row in inbox order."""
+    key = [row["urgency_rank"], row["created_at"], row["session_id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_inbox_cursor(cursor: str) -> tuple[int, str, str]:
+    """Inverse of encode_inbox_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, created_at, session_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(rank, int) or not isinstance(created_at, str) or not isinstance(session_id, str):
+        raise ValueError("invalid cursor")
+    return rank, created_at, session_id
+
+
+def _contact_fields(result) -> tuple[str | None, str | None, str | None]:
+    """(phone, cpr, doctor) from a result dict's triage block, for the denormalised columns."""
+    triage = result.get("triage") if isinstance(result, dict) else None
+    if not isinstance(triage, dict):
+        return None, None, None
+    return triage.get("phone_number"), triage.get("cpr_number"), triage.get("doctor")
+
+
 def confirmation_hours_left(row: dict, now: datetime | None = None) -> float | None:
     """Hours remaining in the window for a pending row; None otherwise."""
     if (row.get("confirmation_status") or "none") != "pending":
@@ -43,15 +103,104 @@ def confirmation_hours_left(row: dict, now: datetime | None = None) -> float | N
     return max(0.0, remaining.total_seconds() / 3600.0)
 
 
+CONVERSATION_CACHE_SESSIONS = 256
+
+
+def _transcript_message(row_id: int, raw: str) -> dict | None:
+    """A stored SDK item as a {id, role, content} transcript message, or None if it
+    is not patient-visible text (tool calls, reasoning, empty content)."""
+    try:
+        msg = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    role = msg.get("role")
+    content = msg.get("content")
+    if role == "user" and isinstance(content, str) and content.strip():
+        return {"id": row_id, "role": "user", "content": content}
+    if role == "assistant":
+        if isinstance(content, list):
+            text = "\n".join(
+                part.get("text", "") for part in content
+                if isinstance(part, dict) and part.get("type") == "output_text"
+            )
+        else:
+            text = content if isinstance(content, str) else None
+        if text and text.strip():
+            return {"id": row_id, "role": "assistant", "content": text}
+    return None
+
+
+class ConversationReader:
+    """Parsed patient transcripts from the SDK session database (triage_sessions.db).
+
+    Rows are read in id order over the (session_id, id) index and streamed off the
+    cursor. Parsed transcripts are cached per session (LRU, max_sessions); a repeat
+    read only fetches and parses rows added since the last one. Each message
+    carries its row id, which callers pass back as `after` to tail a live chat.
+    """
+
+    def __init__(self, sdk_db: str | Path, max_sessions: int = CONVERSATION_CACHE_SESSIONS):
+        self._db = ConnectionPool(sdk_db)
+        self.max_sessions = max_sessions
+        self._cache: OrderedDict[str, tuple[int, list[dict]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _ensure_index(self, conn) -> bool:
+        """Make sure the session index exists; False until the SDK has created its table."""
+        if self._ready:
+            return True
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agent_messages'"
+        ).fetchone():
+            return False
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_agent_messages_session_id "
+            "ON agent_messages (session_id, id)"
+        )
+        self._ready = True
+        return True
+
+    def read(self, session_id: str, after: int = 0) -> list[dict]:
+        """Transcript messages of a session with row id > after, in order."""
+        with self._lock:
+            last_id, messages = self._cache.get(session_id, (0, []))
+        conn = self._db.connection()
+        if not self._ensure_index(conn):
+            return []
+        new, seen = [], last_id
+        for row_id, raw in conn.execute(
+            "SELECT id, message_data FROM agent_messages "
+            "WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, last_id),
+        ):
+            seen = row_id
+            msg = _transcript_message(row_id, raw)
+            if msg is not None:
+                new.append(msg)
+        if seen > last_id:
+            messages = messages + new
+            with self._lock:
+                # Another reader may have extended it meanwhile; keep the longer one
+                if self._cache.get(session_id, (0, []))[0] < seen:
+                    self._cache[session_id] = (seen, messages)
+                self._cache.move_to_end(session_id)
+                while len(self._cache) > self.max_sessions:
+                    self._cache.popitem(last=False)
+        return messages[bisect_right(messages, after, key=lambda m: m["id"]):]
+
+
 class SessionStore:
     """Manages session metadata in a separate SQLite database (not the SDK's session DB)."""
 
     def __init__(self, db_path: str | Path):
         self.db_path = str(db_path)
+        self._db = ConnectionPool(self.db_path)
+        self._conversations = ConversationReader(Path(self.db_path).parent / "triage_sessions.db")
         self._init_db()
 
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._db.transaction() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS sessions (
                     session_id TEXT PRIMARY KEY,
@@ -76,8 +225,16 @@ class SessionStore:
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_comments_session ON comments(session_id)"
             )
+            # Inbox change feed, so every server worker can push rows changed by the others
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS inbox_changes (
+                    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id  TEXT NOT NULL,
+                    origin      TEXT NOT NULL,
+                    created_at  TEXT NOT NULL
+                )
+            """)
             self._ensure_session_columns(conn)
-            conn.commit()
 
     def _ensure_session_columns(self, conn):
         """Idempotently add inbox-workflow columns to an existing sessions table."""
@@ -92,19 +249,55 @@ class SessionStore:
             "confirmation_sent_at": "TEXT",
             "confirmation_confirmed_at": "TEXT",
             "confirmation_cancelled_at": "TEXT",
+            # Denormalised from result_json at save time so the inbox never parses JSON
+            "phone": "TEXT",
+            "cpr": "TEXT",
+            "doctor": "TEXT",
+            "urgency_rank": f"INTEGER NOT NULL DEFAULT {DEFAULT_URGENCY_RANK}",
         }
         for col, decl in migrations.items():
             if col not in existing:
                 conn.execute(f"ALTER TABLE sessions ADD COLUMN {col} {decl}")
+        if not {"phone", "cpr", "doctor"} <= existing:
+            # One-off backfill for rows saved before the columns existed
+            conn.execute(
+                "UPDATE sessions SET "
+                "phone = json_extract(result_json, '$.triage.phone_number'), "
+                "cpr = json_extract(result_json, '$.triage.cpr_number'), "
+                "doctor = json_extract(result_json, '$.triage.doctor') "
+                "WHERE result_json IS NOT NULL AND json_valid(result_json)"
+            )
+        if "urgency_rank" not in existing:
+            conn.execute(
+                "UPDATE sessions SET urgency_rank = CASE urgency "
+                "WHEN 'immediate' THEN 0 WHEN 'high' THEN 1 WHEN 'normal' THEN 2 "
+                f"ELSE {DEFAULT_URGENCY_RANK} END"
+            )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_doctor ON sessions(doctor)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_inbox "
+            "ON sessions(urgency_rank, created_at DESC, session_id DESC) "
+            "WHERE status IN ('completed', 'escalated')"
+        )
+        # The active board seeks this instead of filtering its way through every
+        # processed row ever written to the index above
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_inbox_open "
+            "ON sessions(urgency_rank, created_at DESC, session_id DESC) "
+            f"WHERE status IN ('completed', 'escalated') AND {INBOX_OPEN}"
+        )
+        # Confirmation links are looked up by token; only rows with a live token are indexed
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_confirmation_token "
+            "ON sessions(confirmation_token) WHERE confirmation_token IS NOT NULL"
+        )
 
     def create_session(self, session_id: str) -> SessionMeta:
         now = datetime.now(timezone.utc)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT INTO sessions (session_id, created_at, status) VALUES (?, ?, ?)",
-                (session_id, now.isoformat(), "active"),
-            )
-            conn.commit()
+        self._db.connection().execute(
+            "INSERT INTO sessions (session_id, created_at, status) VALUES (?, ?, ?)",
+            (session_id, now.isoformat(), "active"),
+        )
         return SessionMeta(session_id=session_id, created_at=now)
 
     def update_session(
@@ -132,19 +325,15 @@ class SessionStore:
         if not updates:
             return
         values.append(session_id)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                f"UPDATE sessions SET {', '.join(updates)} WHERE session_id = ?",
-                values,
-            )
-            conn.commit()
+        self._db.connection().execute(
+            f"UPDATE sessions SET {', '.join(updates)} WHERE session_id = ?",
+            values,
+        )
 
     def get_session(self, session_id: str) -> dict | None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            row = conn.execute(
-                "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
-            ).fetchone()
+        row = self._db.connection().execute(
+            "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
         if row is None:
             return None
         result = dict(row)
@@ -153,62 +342,130 @@ class SessionStore:
         return result
 
     def list_sessions(self, limit: int = 50) -> list[dict]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(
-                "SELECT session_id, created_at, patient_name, status, condition_name, result_type "
-                "FROM sessions ORDER BY created_at DESC LIMIT ?",
-                (limit,),
-            ).fetchall()
+        rows = self._db.connection().execute(
+            "SELECT session_id, created_at, patient_name, status, condition_name, result_type "
+            "FROM sessions ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
         return [dict(r) for r in rows]
 
-    def list_inbox(self) -> list[dict]:
-        """Actionable sessions (completed/escalated), urgent-first then newest.
-        Each row is enriched with phone, CPR, and doctor parsed from the stored result JSON."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def list_inbox(self, doctor: str | None = None) -> list[dict]:
+        """Every actionable session (completed/escalated), urgent-first then newest.
+        Unbounded — the API uses page_inbox instead."""
+        where, params = self._inbox_filters(doctor=doctor)
+        rows = self._db.connection().execute(
+            f"SELECT {INBOX_COLUMNS} FROM sessions WHERE {where} {INBOX_ORDER}", params
+        ).fetchall()
+        return [self._inbox_row(r) for r in rows]
+
+    def get_inbox_row(self, session_id: str) -> dict | None:
+        """A single session in inbox-row shape, or None if it is not in the inbox."""
+        where, params = self._inbox_filters()
+        row = self._db.connection().execute(
+            f"SELECT {INBOX_COLUMNS} FROM sessions WHERE {where} AND session_id = ?",
+            params + [session_id],
+        ).fetchone()
+        return self._inbox_row(row) if row else None
+
+    def page_inbox(
+        self,
+        limit: int = 50,
+        cursor: str | None = None,
+        processing_status: list[str] | None = None,
+        doctor: str | None = None,
+        confirmation: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        closed: bool | None = None,
+    ) -> dict:
+        """One page of the inbox in (urgency rank, newest) order using a keyset cursor.
+
+        Filters: processing_status (any of), doctor, confirmation (effective state:
+        none|pending|expired|confirmed|cancelled), a created_at range [since, until)
+        given as ISO dates or datetimes, and closed (done or cancelled; False gives
+        the active board only).
+        Returns {items, next_cursor}; next_cursor is None on the last page.
+        Raises ValueError for a malformed cursor.
+        """
+        where, params = self._inbox_filters(processing_status, doctor, confirmation, since, until, closed)
+        conn = self._db.connection()
+        sql = f"SELECT {INBOX_COLUMNS} FROM sessions WHERE {where} AND {{}} {INBOX_ORDER} LIMIT ?"
+        if cursor:
+            # Two index seeks: the rest of the cursor's urgency rank, then the ranks after it
+            rank, created_at, session_id = decode_inbox_cursor(cursor)
             rows = conn.execute(
-                "SELECT session_id, created_at, patient_name, status, condition_name, "
-                "result_type, processing_status, processed_by, processing_updated_at, urgency, "
-                "confirmation_status, confirmation_sent_at, confirmation_confirmed_at, "
-                "confirmation_cancelled_at, result_json "
-                "FROM sessions WHERE status IN ('completed', 'escalated') "
-                "ORDER BY CASE urgency "
-                "  WHEN 'immediate' THEN 0 WHEN 'high' THEN 1 WHEN 'normal' THEN 2 ELSE 3 END, "
-                "created_at DESC"
+                sql.format("urgency_rank = ? AND (created_at, session_id) < (?, ?)"),
+                params + [rank, created_at, session_id, limit + 1],
             ).fetchall()
-        enriched = []
-        for r in rows:
-            row = dict(r)
-            raw = row.pop("result_json", None)
-            phone, cpr, doctor = None, None, None
-            if raw:
-                try:
-                    triage = (json.loads(raw) or {}).get("triage") or {}
-                    phone = triage.get("phone_number")
-                    cpr = triage.get("cpr_number")
-                    doctor = triage.get("doctor")
-                except (json.JSONDecodeError, TypeError, AttributeError):
-                    pass
-            row["phone"] = phone
-            row["cpr"] = cpr
-            row["doctor"] = doctor
-            row["confirmation"] = effective_confirmation_status(row)
-            row["confirmation_hours_left"] = confirmation_hours_left(row)
-            enriched.append(row)
-        return enriched
+            if len(rows) <= limit:
+                rows += conn.execute(
+                    sql.format("urgency_rank > ?"), params + [rank, limit + 1 - len(rows)],
+                ).fetchall()
+        else:
+            rows = conn.execute(sql.format("1"), params + [limit + 1]).fetchall()
+        items = [self._inbox_row(r) for r in rows[:limit]]
+        next_cursor = encode_inbox_cursor(items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _inbox_filters(
+        processing_status: list[str] | None = None,
+        doctor: str | None = None,
+        confirmation: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        closed: bool | None = None,
+    ) -> tuple[str, list]:
+        clauses = ["status IN ('completed', 'escalated')"]
+        params: list = []
+        if processing_status:
+            clauses.append(f"COALESCE(processing_status, 'new') IN ({', '.join('?' * len(processing_status))})")
+            params += processing_status
+        if doctor is not None:
+            clauses.append("doctor = ?")
+            params.append(doctor)
+        if confirmation is not None:
+            cutoff = (datetime.now(timezone.utc) - timedelta(hours=CONFIRMATION_TTL_HOURS)).isoformat()
+            if confirmation == "none":
+                clauses.append("COALESCE(confirmation_status, 'none') = 'none'")
+            elif confirmation == "pending":
+                clauses.append(
+                    "confirmation_status = 'pending' "
+                    "AND (confirmation_sent_at IS NULL OR confirmation_sent_at >= ?)"
+                )
+                params.append(cutoff)
+            elif confirmation == "expired":
+                clauses.append("confirmation_status = 'pending' AND confirmation_sent_at < ?")
+                params.append(cutoff)
+            else:
+                clauses.append("confirmation_status = ?")
+                params.append(confirmation)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if closed is not None:
+            clauses.append(INBOX_CLOSED if closed else INBOX_OPEN)
+        return " AND ".join(clauses), params
+
+    @staticmethod
+    def _inbox_row(r) -> dict:
+        row = dict(r)
+        row["confirmation"] = effective_confirmation_status(row)
+        row["confirmation_hours_left"] = confirmation_hours_left(row)
+        return row
 
     def set_processing(self, session_id: str, processing_status: str,
                        processed_by: str | None = None) -> dict | None:
         now = datetime.now(timezone.utc).isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._db.transaction() as conn:
             cur = conn.execute(
                 "UPDATE sessions SET processing_status = ?, processed_by = ?, "
                 "processing_updated_at = ? WHERE session_id = ?",
                 (processing_status, processed_by, now, session_id),
             )
-            conn.commit()
             if cur.rowcount == 0:
                 return None
             row = conn.execute(
@@ -218,41 +475,70 @@ class SessionStore:
         return dict(row)
 
     def set_urgency(self, session_id: str, urgency: str):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "UPDATE sessions SET urgency = ? WHERE session_id = ?",
-                (urgency, session_id),
-            )
-            conn.commit()
+        self._db.connection().execute(
+            "UPDATE sessions SET urgency = ?, urgency_rank = ? WHERE session_id = ?",
+            (urgency, urgency_rank(urgency), session_id),
+        )
 
     def save_result(self, session_id: str, result_json: str):
-        with sqlite3.connect(self.db_path) as conn:
+        try:
+            phone, cpr, doctor = _contact_fields(json.loads(result_json))
+        except (json.JSONDecodeError, TypeError):
+            phone, cpr, doctor = None, None, None
+        self._db.connection().execute(
+            "UPDATE sessions SET result_json = ?, phone = ?, cpr = ?, doctor = ? "
+            "WHERE session_id = ?",
+            (result_json, phone, cpr, doctor, session_id),
+        )
+
+    def patch_result(self, session_id: str, fields: dict):
+        """Merge fields into the stored result JSON in place (SQLite json_patch), so a
+        late writer never clobbers columns updated since the result was first saved."""
+        self._db.connection().execute(
+            "UPDATE sessions SET result_json = json_patch(result_json, ?) "
+            "WHERE session_id = ? AND json_valid(result_json)",
+            (json.dumps(fields), session_id),
+        )
+
+    def record_completion(self, session_id: str, triage_data: dict, result: dict,
+                          urgency: str, *, result_type: str = "booking"):
+        """Persist a finished triage in one transaction: status, patient/condition,
+        result type, result JSON, and urgency land together or not at all.
+        result_type is "booking" or "handoff" (handoff => status 'escalated').
+        Raises ValueError for any other result_type."""
+        if result_type not in ("booking", "handoff"):
+            raise ValueError(f"unknown result_type {result_type!r}")
+        status = "escalated" if result_type == "handoff" else "completed"
+        phone, cpr, doctor = _contact_fields(result)
+        with self._db.transaction() as conn:
             conn.execute(
-                "UPDATE sessions SET result_json = ? WHERE session_id = ?",
-                (result_json, session_id),
+                "UPDATE sessions SET status = ?, result_type = ?, result_json = ?, "
+                "urgency = ?, urgency_rank = ?, phone = ?, cpr = ?, doctor = ?, "
+                "patient_name = COALESCE(?, patient_name), "
+                "condition_name = COALESCE(?, condition_name) "
+                "WHERE session_id = ?",
+                (
+                    status, result_type, json.dumps(result), urgency, urgency_rank(urgency),
+                    phone, cpr, doctor,
+                    triage_data.get("patient_name") or None,
+                    triage_data.get("condition_name") or None,
+                    session_id,
+                ),
             )
-            conn.commit()
 
     def mark_booked(self, session_id: str) -> dict:
         """Generate a confirmation token, set status=pending, sent_at=now.
         Returns {ok, token, phone} or {ok: False, error}."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._db.transaction() as conn:
             row = conn.execute(
-                "SELECT result_type, result_json FROM sessions WHERE session_id = ?",
+                "SELECT result_type, phone FROM sessions WHERE session_id = ?",
                 (session_id,),
             ).fetchone()
             if row is None:
                 return {"ok": False, "error": "not found"}
             if (row["result_type"] or "") != "booking":
                 return {"ok": False, "error": "not a booking"}
-            phone = None
-            if row["result_json"]:
-                try:
-                    triage = (json.loads(row["result_json"]) or {}).get("triage") or {}
-                    phone = triage.get("phone_number")
-                except (json.JSONDecodeError, TypeError, AttributeError):
-                    phone = None
+            phone = row["phone"]
             if not phone:
                 return {"ok": False, "error": "no phone on file"}
             token = secrets.token_urlsafe(24)
@@ -263,16 +549,15 @@ class SessionStore:
                 "confirmation_cancelled_at=NULL WHERE session_id=?",
                 (token, now, session_id),
             )
-            conn.commit()
         return {"ok": True, "token": token, "phone": phone}
 
     def confirm_by_token(self, token: str) -> dict:
         """Patient confirms via token. Returns
         {status: confirmed|expired|already_confirmed|cancelled|invalid, session_id?}."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._db.transaction() as conn:
             row = conn.execute(
-                "SELECT * FROM sessions WHERE confirmation_token = ?", (token,)
+                "SELECT session_id, confirmation_status, confirmation_sent_at "
+                "FROM sessions WHERE confirmation_token = ?", (token,)
             ).fetchone()
             if row is None:
                 return {"status": "invalid"}
@@ -290,13 +575,54 @@ class SessionStore:
                 "confirmation_confirmed_at=? WHERE session_id=?",
                 (now, d["session_id"]),
             )
-            conn.commit()
             return {"status": "confirmed", "session_id": d["session_id"]}
 
+    def purge_stale_tokens(self, now: datetime | None = None) -> int:
+        """Clear confirmation tokens sent more than TTL + retention hours ago, so the
+        token index only holds links that can still produce a useful answer.
+        Status and timestamps are kept. Returns the number of tokens cleared."""
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - timedelta(hours=CONFIRMATION_TTL_HOURS + CONFIRMATION_TOKEN_RETENTION_HOURS)
+        cur = self._db.connection().execute(
+            "UPDATE sessions SET confirmation_token = NULL "
+            "WHERE confirmation_token IS NOT NULL AND confirmation_sent_at < ?",
+            (cutoff.isoformat(),),
+        )
+        return cur.rowcount
+
+    def log_inbox_change(self, session_id: str, origin: str):
+        """Append to the inbox change feed; origin identifies the writing worker."""
+        self._db.connection().execute(
+            "INSERT INTO inbox_changes (session_id, origin, created_at) VALUES (?, ?, ?)",
+            (session_id, origin, datetime.now(timezone.utc).isoformat()),
+        )
+
+    def inbox_changes_since(self, after_id: int | None, origin: str) -> tuple[int, list[str]]:
+        """Session ids changed by other workers since after_id, and the new high-water
+        mark. after_id None starts from the current end of the feed."""
+        conn = self._db.connection()
+        if after_id is None:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM inbox_changes").fetchone()[0], []
+        rows = conn.execute(
+            "SELECT id, session_id, origin FROM inbox_changes WHERE id > ? ORDER BY id",
+            (after_id,),
+        ).fetchall()
+        if not rows:
+            return after_id, []
+        changed = list(dict.fromkeys(r["session_id"] for r in rows if r["origin"] != origin))
+        return rows[-1]["id"], changed
+
+    def prune_inbox_changes(self, older_than_hours: float = 1.0) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=older_than_hours)
+        cur = self._db.connection().execute(
+            "DELETE FROM inbox_changes WHERE created_at < ?", (cutoff.isoformat(),),
+        )
+        return cur.rowcount
+
     def cancel_booking(self, session_id: str) -> dict:
         """Secretary marks a booking cancelled (record-keeping; external slot
         release is manual). Returns {ok, status} or {ok: False, error}."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._db.transaction() as conn:
             row = conn.execute(
                 "SELECT session_id FROM sessions WHERE session_id = ?", (session_id,)
             ).fetchone()
@@ -308,97 +634,48 @@ class SessionStore:
                 "confirmation_cancelled_at=? WHERE session_id=?",
                 (now, session_id),
             )
-            conn.commit()
         return {"ok": True, "status": "cancelled"}
 
     def get_result(self, session_id: str) -> dict | None:
-        with sqlite3.connect(self.db_path) as conn:
-            row = conn.execute(
-                "SELECT result_json FROM sessions WHERE session_id = ?", (session_id,)
-            ).fetchone()
+        row = self._db.connection().execute(
+            "SELECT result_json FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
         if row and row[0]:
             return json.loads(row[0])
         return None
 
-    def get_conversation(self, session_id: str) -> list[dict]:
-        """Read conversation messages from the SDK's triage_sessions.db.
-        Returns chronological list of {role, content} dicts for user/assistant messages."""
-        sdk_db = str(Path(self.db_path).parent / "triage_sessions.db")
-        messages = []
-        try:
-            with sqlite3.connect(sdk_db) as conn:
-                rows = conn.execute(
-                    "SELECT message_data FROM agent_messages WHERE session_id = ? ORDER BY created_at ASC",
-                    (session_id,),
-                ).fetchall()
-            for (raw,) in rows:
-                try:
-                    msg = json.loads(raw)
-                except (json.JSONDecodeError, TypeError):
-                    continue
-                role = msg.get("role")
-                if role == "user":
-                    content = msg.get("content", "")
-                    if isinstance(content, str) and content.strip():
-                        # Skip internal agent inputs (handoff/confirmation prompts)
-                        if content.startswith("Triage data collected") or content.startswith("Patient language:"):
-                            continue
-                        messages.append({"role": "user", "content": content})
-                elif role == "assistant":
-                    content = msg.get("content")
-                    text = None
-                    if isinstance(content, list):
-                        text_parts = []
-                        for part in content:
-                            if isinstance(part, dict) and part.get("type") == "output_text":
-                                text_parts.append(part.get("text", ""))
-                        if text_parts:
-                            text = "\n".join(text_parts)
-                    elif isinstance(content, str) and content.strip():
-                        text = content
-                    if text:
-                        # Skip internal results (JSON handoff/booking outputs)
-                        stripped = text.strip()
-                        if stripped.startswith("{") and '"triage"' in stripped:
-                            continue
-                        messages.append({"role": "assistant", "content": text})
-        except Exception:
-            pass
-        return messages
+    def get_conversation(self, session_id: str, after: int = 0) -> list[dict]:
+        """Chronological {id, role, content} user/assistant messages from the SDK's
+        triage_sessions.db, only those with id > after (see ConversationReader)."""
+        return self._conversations.read(session_id, after)
 
     def add_comment(self, session_id: str, author: str, body: str) -> dict:
         now = datetime.now(timezone.utc).isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute(
-                "INSERT INTO comments (session_id, author, body, created_at) VALUES (?, ?, ?, ?)",
-                (session_id, author, body, now),
-            )
-            conn.commit()
-            comment_id = cur.lastrowid
+        cur = self._db.connection().execute(
+            "INSERT INTO comments (session_id, author, body, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, author, body, now),
+        )
+        comment_id = cur.lastrowid
         return {
             "id": comment_id, "session_id": session_id, "author": author,
             "body": body, "created_at": now, "updated_at": None,
         }
 
     def list_comments(self, session_id: str) -> list[dict]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(
-                "SELECT id, session_id, author, body, created_at, updated_at "
-                "FROM comments WHERE session_id = ? ORDER BY created_at ASC, id ASC",
-                (session_id,),
-            ).fetchall()
+        rows = self._db.connection().execute(
+            "SELECT id, session_id, author, body, created_at, updated_at "
+            "FROM comments WHERE session_id = ? ORDER BY created_at ASC, id ASC",
+            (session_id,),
+        ).fetchall()
         return [dict(r) for r in rows]
 
     def update_comment(self, comment_id: int, body: str) -> dict | None:
         now = datetime.now(timezone.utc).isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._db.transaction() as conn:
             cur = conn.execute(
                 "UPDATE comments SET body = ?, updated_at = ? WHERE id = ?",
                 (body, now, comment_id),
             )
-            conn.commit()
             if cur.rowcount == 0:
                 return None
             row = conn.execute(
@@ -408,19 +685,165 @@ class SessionStore:
         return dict(row)
 
     def delete_comment(self, comment_id: int) -> bool:
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute("DELETE FROM comments WHERE id = ?", (comment_id,))
-            conn.commit()
-            return cur.rowcount > 0
+        cur = self._db.connection().execute("DELETE FROM comments WHERE id = ?", (comment_id,))
+        return cur.rowcount > 0
 
     def delete_inactive(self) -> int:
         """Delete all sessions with status 'active' and their comments. Returns count deleted."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._db.transaction() as conn:
             ids = [r[0] for r in conn.execute(
                 "SELECT session_id FROM sessions WHERE status = 'active'"
             ).fetchall()]
             cursor = conn.execute("DELETE FROM sessions WHERE status = 'active'")
             for sid in ids:
                 conn.execute("DELETE FROM comments WHERE session_id = ?", (sid,))
-            conn.commit()
             return cursor.rowcount
+
+
+class AsyncSessionStore:
+    """Awaitable facade over SessionStore so SQLite I/O never runs on the event loop.
+
+    Writes are serialised on one dedicated writer thread (SQLite allows a single
+    writer anyway); reads run on a small reader pool. Each worker thread gets its
+    own pooled connection, and WAL lets readers proceed while the writer commits.
+    """
+
+    def __init__(self, store: SessionStore, readers: int = 4):
+        self.store = store
+        self.db_path = store.db_path
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="store-reader")
+        self._stats_lock = threading.Lock()
+        self._stats = {kind: {"calls": 0, "queue_seconds": 0.0, "queue_max": 0.0,
+                              "run_seconds": 0.0, "run_max": 0.0}
+                       for kind in ("read", "write")}
+
+    async def _submit(self, kind: str, executor: ThreadPoolExecutor, call):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return call()
+            finally:
+                self._record(kind, started - submitted, time.perf_counter() - started)
+
+        return await loop.run_in_executor(executor, timed)
+
+    def _record(self, kind: str, queued: float, ran: float):
+        with self._stats_lock:
+            stats = self._stats[kind]
+            stats["calls"] += 1
+            stats["queue_seconds"] += queued
+            stats["queue_max"] = max(stats["queue_max"], queued)
+            stats["run_seconds"] += ran
+            stats["run_max"] = max(stats["run_max"], ran)
+
+    async def _read(self, fn, *args, **kwargs):
+        return await self._submit("read", self._readers, partial(fn, *args, **kwargs))
+
+    async def _write(self, fn, *args, **kwargs):
+        return await self._submit("write", self._writer, partial(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        """Cumulative contention counters for this process: per kind, calls, time
+        spent queued for a reader/the writer thread and time running. Every write
+        runs on the writer thread, so write run times include SQLite lock waits of
+        autocommit writes too; write_lock breaks out the waits of explicit
+        transactions (see ConnectionPool.lock_stats)."""
+        with self._stats_lock:
+            stats = {kind: dict(s) for kind, s in self._stats.items()}
+        stats["write_lock"] = self.store._db.lock_stats()
+        return stats
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+    # Reads
+
+    async def get_session(self, session_id: str) -> dict | None:
+        return await self._read(self.store.get_session, session_id)
+
+    async def list_sessions(self, limit: int = 50) -> list[dict]:
+        return await self._read(self.store.list_sessions, limit)
+
+    async def list_inbox(self, doctor: str | None = None) -> list[dict]:
+        return await self._read(self.store.list_inbox, doctor)
+
+    async def get_inbox_row(self, session_id: str) -> dict | None:
+        return await self._read(self.store.get_inbox_row, session_id)
+
+    async def page_inbox(self, **kwargs) -> dict:
+        return await self._read(self.store.page_inbox, **kwargs)
+
+    async def get_result(self, session_id: str) -> dict | None:
+        return await self._read(self.store.get_result, session_id)
+
+    async def get_conversation(self, session_id: str, after: int = 0) -> list[dict]:
+        return await self._read(self.store.get_conversation, session_id, after)
+
+    async def list_comments(self, session_id: str) -> list[dict]:
+        return await self._read(self.store.list_comments, session_id)
+
+    async def inbox_changes_since(self, after_id: int | None, origin: str) -> tuple[int, list[str]]:
+        return await self._read(self.store.inbox_changes_since, after_id, origin)
+
+    # Writes
+
+    async def create_session(self, session_id: str) -> SessionMeta:
+        return await self._write(self.store.create_session, session_id)
+
+    async def update_session(self, session_id: str, **fields):
+        return await self._write(self.store.update_session, session_id, **fields)
+
+    async def patch_result(self, session_id: str, fields: dict):
+        return await self._write(self.store.patch_result, session_id, fields)
+
+    async def record_completion(self, session_id: str, triage_data: dict, result: dict,
+                                urgency: str, *, result_type: str = "booking"):
+        return await self._write(
+            self.store.record_completion, session_id, triage_data, result, urgency,
+            result_type=result_type,
+        )
+
+    async def set_processing(self, session_id: str, processing_status: str,
+                             processed_by: str | None = None) -> dict | None:
+        return await self._write(self.store.set_processing, session_id, processing_status, processed_by)
+
+    async def set_urgency(self, session_id: str, urgency: str):
+        return await self._write(self.store.set_urgency, session_id, urgency)
+
+    async def save_result(self, session_id: str, result_json: str):
+        return await self._write(self.store.save_result, session_id, result_json)
+
+    async def mark_booked(self, session_id: str) -> dict:
+        return await self._write(self.store.mark_booked, session_id)
+
+    async def confirm_by_token(self, token: str) -> dict:
+        return await self._write(self.store.confirm_by_token, token)
+
+    async def cancel_booking(self, session_id: str) -> dict:
+        return await self._write(self.store.cancel_booking, session_id)
+
+    async def purge_stale_tokens(self) -> int:
+        return await self._write(self.store.purge_stale_tokens)
+
+    async def log_inbox_change(self, session_id: str, origin: str):
+        return await self._write(self.store.log_inbox_change, session_id, origin)
+
+    async def prune_inbox_changes(self) -> int:
+        return await self._write(self.store.prune_inbox_changes)
+
+    async def add_comment(self, session_id: str, author: str, body: str) -> dict:
+        return await self._write(self.store.add_comment, session_id, author, body)
+
+    async def update_comment(self, comment_id: int, body: str) -> dict | None:
+        return await self._write(self.store.update_comment, comment_id, body)
+
+    async def delete_comment(self, comment_id: int) -> bool:
+        return await self._write(self.store.delete_comment, comment_id)
+
+    async def delete_inactive(self) -> int:
+        return await self._write(self.store.delete_inactive)
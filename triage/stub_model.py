@@ -0,0 +1,196 @@
+"""Offline model provider: scripted replies with synthetic latency, no network.
+
+MODEL_PROVIDER=stub gives the triage, handoff and confirmation agents a StubModel
+instead of the OpenAI model named by TRIAGE_MODEL, so the server's own throughput and
+latency (orchestration, stores, WebSocket) can be measured on a laptop.
+
+A script maps an agent key ("triage", "handoff", "confirmation") to its turns. A
+turn is the list of model responses to one incoming user message; each response is
+shorthand or an output item recorded from a real run (ModelResponse.output[i].model_dump()):
+
+    {
+      "triage": [
+        [{"tool": "fetch_condition_details", "arguments": {"condition_id": 42}},
+         {"text": "Do you have a referral from your doctor?"}],
+        [{"tool": "complete_triage", "arguments": {"data": {...}}}]
+      ],
+      "confirmation": [[{"text": "Thank you!"}]]
+    }
+
+The turn is picked by the number of user messages in the model input, the response
+within it by the tool outputs since the last one. A StubModel therefore keeps no
+per-conversation state and serves any number of concurrent sessions. Past the end of
+a script its last turn repeats. Scripts longer than the replay window need
+HISTORY_WINDOW_MESSAGES=0, since the window drops older user messages. Agents the
+script leaves out use DEFAULT_SCRIPT (a three-turn cystoscopy booking).
+
+StubModel builds its responses with agents.testing, which is newer than the
+openai-agents version requirements.txt pins. It is imported only when a stub model
+answers, so importing this module (agents.py does, for model_for) needs nothing extra.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import uuid
+from pathlib import Path
+
+from agents import set_tracing_disabled
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from agents.usage import Usage
+from openai.types.responses import ResponseFunctionToolCall, ResponseOutputMessage
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+from triage.config import MODEL, MODEL_PROVIDER, STUB_MODEL_LATENCY_MS, STUB_MODEL_SCRIPT
+
+_DEFAULT_TRIAGE = {
+    "language": "en", "patient_name": "Load Test", "phone_number": "12345678",
+    "cpr_number": "010190-1234", "insurance_type": "public", "has_referral": True,
+    "condition_id": 42, "condition_name": "Cystoscopy", "category": "C", "doctor": "HS",
+    "duration_minutes": 30,
+}
+
+DEFAULT_SCRIPT = {
+    "triage": [
+        [{"tool": "fetch_condition_details", "arguments": {"condition_id": 42}},
+         {"text": "Thank you. Do you have a referral from your doctor?"}],
+        [{"text": "Could I have your CPR number and the best mobile number to reach you on?"}],
+        [{"tool": "complete_triage", "arguments": {"data": _DEFAULT_TRIAGE}}],
+    ],
+    "handoff": [[{"handoff": True}]],
+    "confirmation": [[{"text": "Thank you! The clinic will call you to confirm the appointment."}]],
+}
+
+
+def parse_latency(spec: str) -> tuple[float, float]:
+    """"400" or "200-800" (milliseconds) -> (low, high) in seconds."""
+    low, _, high = spec.partition("-")
+    low_ms = float(low or 0)
+    return low_ms / 1000, float(high or low_ms) / 1000
+
+
+def load_script(path: str | Path | None) -> dict:
+    script = dict(DEFAULT_SCRIPT)
+    if path:
+        script.update(json.loads(Path(path).read_text()))
+    return script
+
+
+def _estimate_tokens(value) -> int:
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    return max(1, len(text) // 4)
+
+
+def _position(items: list) -> tuple[int, int]:
+    """(user messages so far - 1, tool outputs since the last user message)."""
+    turn, step = -1, 0
+    for item in items:
+        if not isinstance(item, dict):
+            item = item.model_dump() if hasattr(item, "model_dump") else {}
+        if item.get("role") == "user" and item.get("type", "message") == "message":
+            turn, step = turn + 1, 0
+        elif item.get("type") == "function_call_output":
+            step += 1
+    return max(turn, 0), step
+
+
+def _handoff_output(items: list) -> str:
+    """A HandoffRequest for the triage data embedded in run_handoff's prompt."""
+    prompt = next((i.get("content") for i in reversed(items)
+                   if isinstance(i, dict) and i.get("role") == "user"), "")
+    prompt = prompt if isinstance(prompt, str) else ""
+    head, _, reason = prompt.partition("\n\nEscalation reason: ")
+    try:
+        triage = json.loads(head[head.index("{"):])
+    except ValueError:
+        triage = {}
+    return json.dumps({
+        "triage": triage,
+        "reason": reason.split("\n", 1)[0] or "Escalation",
+        "urgency": "immediate" if triage.get("category") == "A" else "normal",
+        "conversation_summary": "Offline stub summary of the conversation.",
+        "suggested_action": "Call the patient back.",
+    }, ensure_ascii=False)
+
+
+def _output_item(spec: dict, items: list):
+    from agents.testing import assistant_message, function_call
+    if "type" in spec:  # recorded output item
+        if spec["type"] == "function_call":
+            return ResponseFunctionToolCall.model_validate(spec)
+        return ResponseOutputMessage.model_validate(spec)
+    if "tool" in spec:
+        call_id = f"call_{uuid.uuid4().hex[:12]}"
+        return function_call(spec["tool"], spec.get("arguments") or {}, call_id=call_id)
+    if spec.get("handoff"):
+        return assistant_message(_handoff_output(items), item_id=f"msg_{uuid.uuid4().hex[:12]}")
+    text = spec["text"]
+    if not isinstance(text, str):  # structured final output (output_type agents)
+        text = json.dumps(text, ensure_ascii=False)
+    return assistant_message(text, item_id=f"msg_{uuid.uuid4().hex[:12]}")
+
+
+class StubModel(Model):
+    """Serves an agent's script turns with synthetic latency (see module docstring).
+
+    Usage is estimated at ~4 characters per token. Instructions seen before by this
+    model count as cached input, like a provider prompt cache would.
+    """
+
+    def __init__(self, turns: list[list[dict]], latency: tuple[float, float] = (0.0, 0.0)):
+        if not turns or not all(turns):
+            raise ValueError("a stub script needs at least one non-empty turn")
+        self.turns = turns
+        self.latency = latency
+        self._seen_instructions: set[str] = set()
+
+    def _step(self, system_instructions: str | None, input):
+        from agents.testing import ModelStep
+        items = [{"role": "user", "content": input}] if isinstance(input, str) else list(input)
+        turn, step = _position(items)
+        responses = self.turns[min(turn, len(self.turns) - 1)]
+        output = [_output_item(responses[min(step, len(responses) - 1)], items)]
+
+        prefix = system_instructions or ""
+        digest = hashlib.sha256(prefix.encode()).hexdigest()
+        cached = _estimate_tokens(prefix) if digest in self._seen_instructions else 0
+        self._seen_instructions.add(digest)
+        input_tokens = _estimate_tokens(prefix) + _estimate_tokens(items)
+        output_tokens = _estimate_tokens([o.model_dump() for o in output])
+        usage = Usage(
+            requests=1,
+            input_tokens=input_tokens,
+            input_tokens_details=InputTokensDetails(cached_tokens=cached, cache_write_tokens=0),
+            output_tokens=output_tokens,
+            output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+            total_tokens=input_tokens + output_tokens,
+        )
+        return ModelStep(output=output, usage=usage, response_id=f"stub_{uuid.uuid4().hex[:12]}")
+
+    async def _delay(self):
+        low, high = self.latency
+        if high > 0:
+            await asyncio.sleep(random.uniform(low, high))
+
+    async def get_response(self, system_instructions, input, *args, **kwargs) -> ModelResponse:
+        await self._delay()
+        step = self._step(system_instructions, input)
+        return ModelResponse(output=list(step.output), usage=step.usage, response_id=step.response_id)
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        from agents.testing import ScriptedModel
+        await self._delay()
+        # ScriptedModel turns the step into the SDK's normalized stream events
+        model = ScriptedModel([self._step(system_instructions, input)])
+        async for event in model.stream_response(system_instructions, input, *args, **kwargs):
+            yield event
+
+
+def model_for(agent_key: str) -> str | Model:
+    """The model an agent runs on: the MODEL name, or a StubModel when MODEL_PROVIDER=stub."""
+    if MODEL_PROVIDER != "stub":
+        return MODEL
+    set_tracing_disabled(True)  # offline: no trace export either
+    return StubModel(load_script(STUB_MODEL_SCRIPT)[agent_key], parse_latency(STUB_MODEL_LATENCY_MS))
@@ -1,25 +1,105 @@
-"""Tool functions for the triage agent — both raw helpers and @function_tool wrappers."""
+"""Tool functions for the triage agent — typed lookups, their JSON adapters, and @function_tool wrappers."""
 
 import json
-from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+from datetime import date, datetime
 
 from agents import function_tool
 from agents.agent import ToolsToFinalOutputResult
 from agents.tool import FunctionToolResult
 
-from triage.config import get_conditions
+from triage.conditions import CycleWindow, Questionnaire
+from triage.config import get_condition
 from triage.models import TriageData
 
 
 # =============================================================================
-# Raw Tool Functions (deterministic Python)
+# Typed lookups (deterministic Python, for internal callers such as enrich_booking)
+# =============================================================================
+
+NO_CYCLE_CONSTRAINT = CycleWindow(cycle_dependent=False, message="No cycle constraint for this procedure.")
+NO_CYCLE_PROVERA = CycleWindow(
+    cycle_dependent=True,
+    no_cycle=True,
+    provera_recommended=True,
+    message="Patient has no regular cycle. Doctor may prescribe Provera (10 days) to induce a period. Booking window can be calculated 2-4 days after completing the course.",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class LabRequirement:
+    lab_required: bool
+    tests: tuple[str, ...] = ()
+    description: str | None = None
+    reason: str | None = None
+
+    @property
+    def details(self) -> str:
+        """Tests and description as one line for the booking."""
+        return f"{', '.join(self.tests)}. {self.description}" if self.tests else self.description or ""
+
+    def to_dict(self) -> dict:
+        if not self.lab_required:
+            return {"lab_required": False, "reason": self.reason} if self.reason else {"lab_required": False}
+        test = list(self.tests) if len(self.tests) > 1 else (self.tests[0] if self.tests else None)
+        return {"lab_required": True, "test": test, "description": self.description}
+
+
+def cycle_window(
+    last_period_date: str | date,
+    condition_id: int,
+    cycle_length: int = 28,
+    cycle_range_min: int | None = None,
+    cycle_range_max: int | None = None,
+    no_cycle: bool = False,
+) -> CycleWindow:
+    cond = get_condition(condition_id)
+    if not cond or not cond.cycle:
+        return NO_CYCLE_CONSTRAINT
+    if no_cycle:
+        return NO_CYCLE_PROVERA
+    if isinstance(last_period_date, str):
+        last_period_date = datetime.strptime(last_period_date, "%Y-%m-%d").date()
+    return cond.cycle.window(last_period_date, cycle_length, cycle_range_min, cycle_range_max)
+
+
+def lab_requirements(condition_id: int, patient_age: int | None = None) -> LabRequirement:
+    cond = get_condition(condition_id)
+    if not cond or not cond.lab:
+        return LabRequirement(False)
+    lab = cond.lab
+    if not lab.applies(patient_age):
+        return LabRequirement(False, reason=f"Patient is {lab.max_age} or older, lab not required.")
+    return LabRequirement(True, lab.tests, lab.description)
+
+
+def questionnaires(condition_id: int) -> tuple[Questionnaire, ...] | None:
+    """The condition's questionnaires; None if there is no such condition."""
+    cond = get_condition(condition_id)
+    return cond.questionnaires if cond else None
+
+
+def guidance_document(condition_id: int) -> str | None:
+    cond = get_condition(condition_id)
+    return cond.guidance_document if cond else None
+
+
+def self_pay_price(condition_id: int) -> float | None:
+    cond = get_condition(condition_id)
+    return cond.self_pay_price_dkk if cond else None
+
+
+# =============================================================================
+# Raw Tool Functions (JSON adapters over the typed lookups, for the LLM)
 # =============================================================================
 
 def get_condition_details(condition_id: int) -> str:
-    cond = get_conditions().get(condition_id)
+    cond = get_condition(condition_id)
     if not cond:
         return json.dumps({"error": f"Condition {condition_id} not found"})
-    return json.dumps(cond, indent=2, ensure_ascii=False)
+    # Patient-facing confirmation copy is rendered by triage.confirmation, not the LLM
+    details = {k: v for k, v in cond.raw.items() if k != "confirmation_template"}
+    return json.dumps(details, indent=2, ensure_ascii=False)
 
 
 def calculate_cycle_window(
@@ -30,116 +110,37 @@ def calculate_cycle_window(
     cycle_range_max: int | None = None,
     no_cycle: bool = False,
 ) -> str:
-    cond = get_conditions().get(condition_id)
-    if not cond or not cond.get("cycle_days"):
-        return json.dumps({"cycle_dependent": False, "message": "No cycle constraint for this procedure."})
-
-    if no_cycle:
-        return json.dumps({
-            "cycle_dependent": True,
-            "no_cycle": True,
-            "provera_recommended": True,
-            "message": "Patient has no regular cycle. Doctor may prescribe Provera (10 days) to induce a period. Booking window can be calculated 2-4 days after completing the course."
-        })
-
-    cycle_days = cond["cycle_days"]
-
-    if cycle_days == "just_before_next_period":
-        lp = datetime.strptime(last_period_date, "%Y-%m-%d").date()
-        next_period = lp + timedelta(days=cycle_length)
-        window_start = next_period - timedelta(days=3)
-        window_end = next_period - timedelta(days=1)
-        return json.dumps({
-            "cycle_dependent": True,
-            "valid_start": window_start.isoformat(),
-            "valid_end": window_end.isoformat(),
-            "message": f"Best scheduled just before next period: {window_start.strftime('%b %d')} - {window_end.strftime('%b %d')}"
-        })
-
-    cd_start, cd_end = cycle_days
-    lp = datetime.strptime(last_period_date, "%Y-%m-%d").date()
-    today = date.today()
-
-    window_start = lp + timedelta(days=cd_start - 1)
-    window_end = lp + timedelta(days=cd_end - 1)
-
-    if window_end < today:
-        if cycle_range_min and cycle_range_max:
-            next_lp_earliest = lp + timedelta(days=cycle_range_min)
-            next_lp_latest = lp + timedelta(days=cycle_range_max)
-            next_start = next_lp_earliest + timedelta(days=cd_start - 1)
-            next_end = next_lp_latest + timedelta(days=cd_end - 1)
-            msg = f"This cycle's window has passed. Next window (approximate due to irregular cycle): {next_start.strftime('%b %d')} - {next_end.strftime('%b %d')}"
-        else:
-            next_lp = lp + timedelta(days=cycle_length)
-            next_start = next_lp + timedelta(days=cd_start - 1)
-            next_end = next_lp + timedelta(days=cd_end - 1)
-            msg = f"This cycle's window has passed. Next window: {next_start.strftime('%b %d')} - {next_end.strftime('%b %d')}"
-        return json.dumps({
-            "cycle_dependent": True,
-            "window_passed": True,
-            "next_valid_start": next_start.isoformat(),
-            "next_valid_end": next_end.isoformat(),
-            "message": msg
-        })
-
-    return json.dumps({
-        "cycle_dependent": True,
-        "valid_start": window_start.isoformat(),
-        "valid_end": window_end.isoformat(),
-        "message": f"Valid booking window: {window_start.strftime('%b %d')} - {window_end.strftime('%b %d')} (cycle days {cd_start}-{cd_end})"
-    })
+    return json.dumps(cycle_window(
+        last_period_date, condition_id, cycle_length, cycle_range_min, cycle_range_max, no_cycle,
+    ).to_dict())
 
 
 def get_lab_requirements(condition_id: int, patient_age: int | None = None) -> str:
-    cond = get_conditions().get(condition_id)
-    if not cond or not cond.get("lab"):
-        return json.dumps({"lab_required": False})
-
-    lab = cond["lab"]
-    lab_condition = lab.get("condition", "always")
-
-    if lab_condition == "age_under_30" and patient_age is not None and patient_age >= 30:
-        return json.dumps({"lab_required": False, "reason": "Patient is 30 or older, lab not required."})
-
-    if lab_condition == "age_under_45" and patient_age is not None and patient_age >= 45:
-        return json.dumps({"lab_required": False, "reason": "Patient is 45 or older, lab not required."})
-
-    return json.dumps({
-        "lab_required": True,
-        "test": lab.get("test") or lab.get("tests"),
-        "description": lab["description"],
-    }, ensure_ascii=False)
+    return json.dumps(lab_requirements(condition_id, patient_age).to_dict(), ensure_ascii=False)
 
 
 def get_questionnaire(condition_id: int) -> str:
-    cond = get_conditions().get(condition_id)
-    if not cond:
+    found = questionnaires(condition_id)
+    if found is None:
         return json.dumps({"questionnaires": [], "message": "Condition not found."})
-
-    result = {"questionnaires": []}
-    if cond.get("questionnaires"):
-        for q in cond["questionnaires"]:
-            if isinstance(q, dict):
-                result["questionnaires"].append({"name": q.get("name", ""), "link": q.get("link")})
-            else:
-                result["questionnaires"].append({"name": q, "link": None})
-    if not result["questionnaires"]:
+    result = {"questionnaires": [{"name": q.name, "link": q.link} for q in found]}
+    if not found:
         result["message"] = "No questionnaire required for this condition."
     return json.dumps(result, ensure_ascii=False)
 
 
 def get_guidance_document(condition_id: int) -> str:
-    cond = get_conditions().get(condition_id)
-    if cond and cond.get("guidance_document"):
-        return json.dumps({"document": cond["guidance_document"]})
+    document = guidance_document(condition_id)
+    if document:
+        return json.dumps({"document": document})
     return json.dumps({"document": None, "message": "No guidance document for this condition."})
 
 
 def get_self_pay_price(condition_id: int) -> str:
-    cond = get_conditions().get(condition_id)
-    if cond and cond.get("self_pay_price_dkk"):
-        return json.dumps({"condition_id": condition_id, "name": cond["name"], "price_dkk": cond["self_pay_price_dkk"]}, ensure_ascii=False)
+    price = self_pay_price(condition_id)
+    if price:
+        name = get_condition(condition_id).name
+        return json.dumps({"condition_id": condition_id, "name": name, "price_dkk": price}, ensure_ascii=False)
     return json.dumps({"price_dkk": None, "message": "Price not yet available. Staff will confirm the cost."})
 
 